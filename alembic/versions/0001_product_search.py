@@ -0,0 +1,89 @@
+"""product search
+
+Full-text search index of the products: GIN expression index on Postgres, FTS5 table kept in
+sync by triggers on sqlite. Kept apart from the initial schema, so a database created before the
+migrations and stamped 0001_initial_schema gets it on `alembic upgrade head` whether or not its
+create_all already made it. Every statement is a no-op when the object exists, and the FTS5
+table is filled from the existing products.
+
+Revision ID: 0001_product_search
+Revises: 0001_initial_schema
+Create Date: 2026-10-18 00:00:00
+"""
+from alembic import op
+
+revision = "0001_product_search"
+down_revision = "0001_initial_schema"
+branch_labels = None
+depends_on = None
+
+PRODUCT_SEARCH_INDEX = """
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_search ON products USING gin (((
+    setweight(to_tsvector('english'::regconfig, title), 'A')
+    || setweight(to_tsvector('english'::regconfig, brand), 'B'))
+    || setweight(to_tsvector('english'::regconfig, description), 'C')))
+"""
+
+SQLITE_FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts
+    USING fts5(title, brand, description, category, tokenize='porter unicode61')
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts (rowid, title, brand, description, category)
+        VALUES (new.id, new.title, new.brand, new.description, (SELECT name FROM categories WHERE id = new.category_id));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE ON products BEGIN
+        DELETE FROM products_fts WHERE rowid = old.id;
+        INSERT INTO products_fts (rowid, title, brand, description, category)
+        VALUES (new.id, new.title, new.brand, new.description, (SELECT name FROM categories WHERE id = new.category_id));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+        DELETE FROM products_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS categories_fts_update AFTER UPDATE OF name ON categories BEGIN
+        UPDATE products_fts SET category = new.name
+        WHERE rowid IN (SELECT id FROM products WHERE category_id = new.id);
+    END
+    """,
+    # Products written before the triggers existed are indexed again from scratch.
+    "DELETE FROM products_fts",
+    """
+    INSERT INTO products_fts (rowid, title, brand, description, category)
+    SELECT products.id, products.title, products.brand, products.description, categories.name
+    FROM products JOIN categories ON categories.id = products.category_id
+    """,
+]
+
+SQLITE_FTS_TRIGGERS = [
+    "products_fts_insert", "products_fts_update", "products_fts_delete", "categories_fts_update",
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        # Existing product tables stay writable while the index is built.
+        with op.get_context().autocommit_block():
+            op.execute(PRODUCT_SEARCH_INDEX)
+    elif dialect == "sqlite":
+        for statement in SQLITE_FTS_DDL:
+            op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        with op.get_context().autocommit_block():
+            op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_products_search")
+    elif dialect == "sqlite":
+        for trigger in SQLITE_FTS_TRIGGERS:
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS products_fts")
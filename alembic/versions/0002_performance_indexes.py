@@ -0,0 +1,46 @@
+"""performance indexes
+
+Indexes on the foreign keys every cart fetch and delete cascade filters on, on the product
+listing order and on the admin user listing. On Postgres they are built CONCURRENTLY so
+existing tables stay writable while the indexes are created.
+
+Revision ID: 0002_performance_indexes
+Revises: 0001_product_search
+Create Date: 2026-10-18 00:00:01
+"""
+from alembic import op
+
+revision = "0002_performance_indexes"
+down_revision = "0001_product_search"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_carts_user_id", "carts", ["user_id"]),
+    ("ix_cart_items_cart_id", "cart_items", ["cart_id"]),
+    ("ix_cart_items_product_id", "cart_items", ["product_id"]),
+    ("ix_products_category_id", "products", ["category_id"]),
+    ("ix_products_created_at", "products", ["created_at"]),
+    ("ix_users_role_id", "users", ["role", "id"]),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        # CREATE INDEX CONCURRENTLY can not run inside a transaction.
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, postgresql_concurrently=True)
+    else:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            for name, table, _ in reversed(INDEXES):
+                op.drop_index(name, table_name=table, postgresql_concurrently=True)
+    else:
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,37 @@
+"""stock reservations
+
+Cart lines hold their quantity out of the product stock until reserved_until, the index lets
+the expiry sweeper find the expired lines without scanning every cart line.
+
+Revision ID: 0003_stock_reservations
+Revises: 0002_performance_indexes
+Create Date: 2026-10-18 00:00:02
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003_stock_reservations"
+down_revision = "0002_performance_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A nullable column without default, added without rewriting the table.
+    op.add_column("cart_items", sa.Column("reserved_until", sa.TIMESTAMP(timezone=True), nullable=True))
+    if op.get_bind().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            op.create_index(
+                "ix_cart_items_reserved_until", "cart_items", ["reserved_until"], postgresql_concurrently=True)
+    else:
+        op.create_index("ix_cart_items_reserved_until", "cart_items", ["reserved_until"])
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            op.drop_index("ix_cart_items_reserved_until", table_name="cart_items", postgresql_concurrently=True)
+    else:
+        op.drop_index("ix_cart_items_reserved_until", table_name="cart_items")
+    with op.batch_alter_table("cart_items") as batch_op:
+        batch_op.drop_column("reserved_until")
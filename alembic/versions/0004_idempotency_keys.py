@@ -0,0 +1,35 @@
+"""idempotency keys
+
+Table of the database idempotency store, keeping the response given to every Idempotency-Key.
+
+Revision ID: 0004_idempotency_keys
+Revises: 0003_stock_reservations
+Create Date: 2026-10-18 00:00:03
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004_idempotency_keys"
+down_revision = "0003_stock_reservations"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "idempotency_keys",
+        sa.Column("key", sa.String(length=64), nullable=False),
+        sa.Column("fingerprint", sa.String(length=64), nullable=False),
+        sa.Column("status_code", sa.Integer(), nullable=True),
+        sa.Column("headers", sa.JSON(), nullable=True),
+        sa.Column("body", sa.LargeBinary(), nullable=True),
+        sa.Column("locked_until", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("expires_at", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("key"),
+    )
+    op.create_index("ix_idempotency_keys_expires_at", "idempotency_keys", ["expires_at"])
+
+
+def downgrade():
+    op.drop_index("ix_idempotency_keys_expires_at", table_name="idempotency_keys")
+    op.drop_table("idempotency_keys")
@@ -0,0 +1,82 @@
+"""category facets
+
+Rollup of the product count, effective price range and top brands of every category,
+filled here from the existing products.
+
+Revision ID: 0005_category_facets
+Revises: 0004_idempotency_keys
+Create Date: 2026-10-18 00:00:04
+"""
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005_category_facets"
+down_revision = "0004_idempotency_keys"
+branch_labels = None
+depends_on = None
+
+# Matches the category_facet_top_brands default.
+TOP_BRANDS = 5
+
+
+def upgrade():
+    category_facets = op.create_table(
+        "category_facets",
+        sa.Column("category_id", sa.Integer(), nullable=False),
+        sa.Column("product_count", sa.Integer(), nullable=False),
+        sa.Column("min_price", sa.Float(), nullable=True),
+        sa.Column("max_price", sa.Float(), nullable=True),
+        sa.Column("avg_price", sa.Float(), nullable=True),
+        sa.Column("top_brands", sa.JSON(), nullable=False),
+        sa.Column("updated_at", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(["category_id"], ["categories.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("category_id"),
+    )
+    # Offline SQL scripts have no data to summarize, python -m app.services.facets fills the table afterwards.
+    if op.get_context().as_sql:
+        return
+
+    categories = sa.table("categories", sa.column("id", sa.Integer))
+    products = sa.table(
+        "products",
+        sa.column("category_id", sa.Integer),
+        sa.column("brand", sa.String),
+        sa.column("price", sa.Integer),
+        sa.column("discount_percentage", sa.Float),
+    )
+    price = products.c.price * (1 - products.c.discount_percentage / 100)
+    conn = op.get_bind()
+    totals = {
+        category_id: row for category_id, *row in conn.execute(
+            sa.select(products.c.category_id, sa.func.count(), sa.func.min(price), sa.func.max(price),
+                      sa.func.avg(price)).group_by(products.c.category_id))
+    }
+    brands = defaultdict(list)
+    for category_id, brand, count in conn.execute(
+            sa.select(products.c.category_id, products.c.brand, sa.func.count())
+            .group_by(products.c.category_id, products.c.brand)):
+        brands[category_id].append({"brand": brand, "product_count": count})
+
+    now = datetime.now(timezone.utc)
+    rows = []
+    for category_id in conn.execute(sa.select(categories.c.id)).scalars():
+        count, min_price, max_price, avg_price = totals.get(category_id, (0, None, None, None))
+        top_brands = sorted(brands[category_id], key=lambda brand: (-brand["product_count"], brand["brand"]))
+        rows.append({
+            "category_id": category_id,
+            "product_count": count,
+            "min_price": min_price,
+            "max_price": max_price,
+            "avg_price": avg_price,
+            "top_brands": top_brands[:TOP_BRANDS],
+            "updated_at": now,
+        })
+    if rows:
+        op.bulk_insert(category_facets, rows)
+
+
+def downgrade():
+    op.drop_table("category_facets")
@@ -0,0 +1,81 @@
+"""category facet deltas
+
+The product writes move the category facets by delta: price_sum keeps the average, the brand
+counts of every category keep the top brands, and the index on the category and effective price
+recomputes a price range without a category scan. Filled here from the existing products.
+
+Revision ID: 0006_category_facet_deltas
+Revises: 0005_category_facets
+Create Date: 2026-10-18 00:00:05
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006_category_facet_deltas"
+down_revision = "0005_category_facets"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("category_facets", sa.Column("price_sum", sa.Float(), server_default="0", nullable=False))
+    op.create_table(
+        "category_brand_counts",
+        sa.Column("category_id", sa.Integer(), nullable=False),
+        sa.Column("brand", sa.String(), nullable=False),
+        sa.Column("product_count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["category_id"], ["categories.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("category_id", "brand"),
+    )
+    op.create_index("ix_category_brand_counts_top", "category_brand_counts", ["category_id", "product_count"])
+
+    # Plain SQL, so offline scripts fill the new columns as well.
+    products = sa.table(
+        "products",
+        sa.column("category_id", sa.Integer),
+        sa.column("brand", sa.String),
+        sa.column("price", sa.Integer),
+        sa.column("discount_percentage", sa.Float),
+    )
+    category_facets = sa.table("category_facets", sa.column("category_id", sa.Integer), sa.column("price_sum", sa.Float))
+    category_brand_counts = sa.table(
+        "category_brand_counts",
+        sa.column("category_id", sa.Integer),
+        sa.column("brand", sa.String),
+        sa.column("product_count", sa.Integer),
+    )
+    price = products.c.price * (1 - products.c.discount_percentage / 100)
+    op.execute(
+        category_facets.update().values(price_sum=sa.func.coalesce(
+            sa.select(sa.func.sum(price))
+            .where(products.c.category_id == category_facets.c.category_id)
+            .scalar_subquery(), 0))
+    )
+    op.execute(
+        category_brand_counts.insert().from_select(
+            ["category_id", "brand", "product_count"],
+            sa.select(products.c.category_id, products.c.brand, sa.func.count())
+            .group_by(products.c.category_id, products.c.brand))
+    )
+
+    # The same expression as EFFECTIVE_PRICE in app.models.models, the queries only use the index if they match.
+    effective_price = sa.text("(price * (1 - discount_percentage / 100))")
+    if op.get_bind().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            op.create_index("ix_products_category_effective_price", "products", ["category_id", effective_price],
+                            postgresql_concurrently=True)
+    else:
+        op.create_index("ix_products_category_effective_price", "products", ["category_id", effective_price])
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            op.drop_index("ix_products_category_effective_price", table_name="products",
+                          postgresql_concurrently=True)
+    else:
+        op.drop_index("ix_products_category_effective_price", table_name="products")
+    op.drop_index("ix_category_brand_counts_top", table_name="category_brand_counts")
+    op.drop_table("category_brand_counts")
+    with op.batch_alter_table("category_facets") as batch_op:
+        batch_op.drop_column("price_sum")
@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+
+from app.core.config import settings
+
+# Every cache of the application by name, reported by the internal cache statistics endpoint.
+caches = {}
+
+
+class TTLCache:
+    """
+    In-process cache bounded in size (least recently used entries are evicted first)
+    and in time (entries older than ttl seconds are treated as missing).
+    """
+
+    def __init__(self, name: str, max_entries: int = None, ttl: float = None,
+                 max_entries_setting: str = "cache_max_entries", ttl_setting: str = "cache_ttl_seconds"):
+        self.name = name
+        # Bounds not given explicitly are read from the named settings when the cache is used, not at import.
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self.max_entries_setting = max_entries_setting
+        self.ttl_setting = ttl_setting
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        # Monotonic time of the last invalidation, whether or not an entry was evicted.
+        self.invalidated_at = float("-inf")
+        caches[name] = self
+
+    @property
+    def max_entries(self) -> int:
+        return self._max_entries if self._max_entries is not None else getattr(settings, self.max_entries_setting)
+
+    @property
+    def ttl(self) -> float:
+        return self._ttl if self._ttl is not None else getattr(settings, self.ttl_setting)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self.invalidated_at = time.monotonic()
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def delete_matching(self, predicate):
+        with self._lock:
+            self.invalidated_at = time.monotonic()
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidated_at = time.monotonic()
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "cache": self.name,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+# Read-through caches of the catalog, filled by the services and invalidated by their mutators.
+product_cache = TTLCache("products")
+category_cache = TTLCache("categories")
@@ -1,21 +1,158 @@
+from functools import lru_cache
+
+from pydantic import Field
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     # Database Config
-    db_username: str
-    db_password: str
-    db_hostname: str
-    db_port: int
-    db_name: str
+    db_username: str | None = None
+    db_password: str | None = None
+    db_hostname: str | None = None
+    db_port: int | None = None
+    db_name: str | None = None
+
+    # Full async database url, takes precedence over the db_* fields.
+    # e.g. sqlite+aiosqlite:///./ecommerce.db for local runs.
+    database_url: str | None = None
+
+    # Read Replica Config
+    # Comma separated async urls of read replicas, read-only routes are served from them when set
+    database_replica_urls: str = ""
+    # Replicas further behind the primary are left out until they catch up
+    replica_max_lag_seconds: float = 5
+    replica_check_interval_seconds: float = 5
+    replica_check_timeout: float = 2
+    # Added to the lag measured by the last check, the replica may have fallen further behind since
+    replica_lag_margin_seconds: float = 1
+    # Seconds the reads of a client stay on the primary after it wrote, so it reads its own writes
+    read_your_writes_seconds: float = 10
+    read_your_writes_max_clients: int = 100000
+
+    # Connection Pool Config
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+
+    # Startup Config
+    # Seconds the startup waits for the database before serving anyway, connections are then retried per request
+    db_startup_timeout: float = 5
+    # Warn at startup when the database is not at the latest migration
+    db_check_schema_on_startup: bool = True
+
+    # Query Diagnostics Config
+    # Statements slower than this are logged with their parameters, 0 disables the slow query log
+    slow_query_threshold_ms: float = 500
+    # Also log the query plan of slow statements (runs an extra EXPLAIN on the same connection)
+    slow_query_explain: bool = False
+    # A request running the same statement more often than this is reported as an N+1, 0 disables it
+    n_plus_one_threshold: int = 10
+
+    # Rows validated and inserted together by the bulk product import
+    product_import_chunk_size: int = 1000
+    # Rows fetched per round trip by the streaming product export
+    product_export_batch_size: int = 1000
+
+    # Password Hashing Config
+    # bcrypt cost, stored hashes with another cost are rehashed on the next successful login
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 4
+    # Hashing requests allowed to wait for a worker before new ones are rejected with 503
+    password_hash_max_queue: int = 64
+
+    # Seconds an authenticated user's id and role are reused before being read from the database again
+    principal_cache_ttl_seconds: float = 30
+
+    # Catalog Cache Config
+    cache_max_entries: int = 1024
+    cache_ttl_seconds: float = 60
+
+    # Category Facets Config
+    # Brands listed in the summary of every category
+    category_facet_top_brands: int = 5
+
+    # Stock Reservation Config
+    # Seconds the stock of a cart line stays reserved after its last change
+    stock_reservation_ttl_seconds: int = 900
+    # Seconds between two runs of the task giving expired reservations back, 0 disables it
+    stock_reservation_sweep_interval_seconds: float = 60
+    # Expired lines released per transaction
+    stock_reservation_sweep_batch_size: int = 500
+
+    # Idempotency Config
+    # Where responses to Idempotency-Key requests are kept: memory (per process) or database (shared)
+    idempotency_store: str = "memory"
+    # Seconds a response is replayed to requests repeating its key
+    idempotency_ttl_seconds: int = 86400
+    # Seconds a repeated request waits for the first one to finish before getting a 409
+    idempotency_wait_timeout: float = 10
+    # Seconds after which a key whose request never finished may be taken over (database store)
+    idempotency_lock_timeout: float = 60
+    # Completed keys kept by the memory store, the oldest are dropped first
+    idempotency_max_entries: int = 10000
+
+    # Rate Limit Config
+    rate_limit_enabled: bool = True
+    # Where the token buckets are kept: memory (per process) or redis (shared by every instance)
+    rate_limit_backend: str = "memory"
+    rate_limit_redis_url: str = "redis://localhost:6379/0"
+    # Take the client IP from X-Forwarded-For, only behind a proxy that sets it
+    rate_limit_trust_forwarded_for: bool = False
+    # Buckets kept by the memory backend, the least recently used are dropped first
+    rate_limit_max_keys: int = 100000
+    # Requests a client may send at once per route group, and requests per second it gets back
+    rate_limit_auth_burst: int = Field(10, gt=0)
+    rate_limit_auth_refill: float = Field(0.2, gt=0)
+    rate_limit_search_burst: int = Field(20, gt=0)
+    rate_limit_search_refill: float = Field(2, gt=0)
+    rate_limit_default_burst: int = Field(120, gt=0)
+    rate_limit_default_refill: float = Field(20, gt=0)
+
+    # Cache Invalidation Config
+    # Broadcast cache invalidations to every worker through Postgres LISTEN/NOTIFY
+    cache_invalidation_enabled: bool = True
+    cache_invalidation_channel: str = "cache_invalidation"
+
+    # Seconds clients and CDNs may reuse a catalog response before revalidating it with its ETag
+    catalog_cache_max_age: int = 60
 
     # JWT Config
     secret_key: str
     algorithm: str
     access_token_expire_minutes: int
 
+    @property
+    def async_database_url(self) -> str:
+        if self.database_url:
+            return self.database_url
+        return f"postgresql+asyncpg://{self.db_username}:{self.db_password}@{self.db_hostname}:{self.db_port}/{self.db_name}"
+
+    @property
+    def replica_database_urls(self) -> list[str]:
+        return [url.strip() for url in self.database_replica_urls.split(",") if url.strip()]
+
     class Config:
         env_file = ".env"
 
 
-settings = Settings()
+@lru_cache
+def get_settings() -> Settings:
+    return Settings()
+
+
+class LazySettings:
+    """
+    Stand-in for the Settings instance that only reads the environment and .env on first use,
+    so importing the application does no I/O.
+    """
+
+    def __getattr__(self, name):
+        return getattr(get_settings(), name)
+
+    def __setattr__(self, name, value):
+        setattr(get_settings(), name, value)
+
+
+settings = LazySettings()
@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from starlette import status
+
+from app.core.config import settings
+from app.core.security import hash_password, verify_and_update_password
+
+
+class PasswordHashPool:
+    """
+    Runs bcrypt on a dedicated, bounded thread pool so hashing never blocks the event loop.
+    bcrypt releases the GIL while hashing, so the workers run in parallel with the request handlers.
+    Once workers + max_queue calls are pending, new calls are rejected instead of piling up.
+    """
+
+    def __init__(self, workers: int = None, max_queue: int = None):
+        # Sizes not given explicitly are read from the settings on first use, not at import.
+        self._workers = workers
+        self._max_queue = max_queue
+        self._executor = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    @property
+    def workers(self) -> int:
+        return self._workers if self._workers is not None else settings.password_hash_workers
+
+    @property
+    def max_queue(self) -> int:
+        return self._max_queue if self._max_queue is not None else settings.password_hash_max_queue
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    async def run(self, func, *args):
+        with self._lock:
+            if self.pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many concurrent authentication requests, retry shortly.",
+                    headers={"Retry-After": "1"},
+                )
+            self.pending += 1
+
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            latency = time.perf_counter() - start
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+                self.total_latency += latency
+                self.max_latency = max(self.max_latency, latency)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": min(self.pending, self.workers),
+                "queue_depth": max(self.pending - self.workers, 0),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_latency_ms": round(self.total_latency / self.completed * 1000, 3) if self.completed else 0.0,
+                "max_latency_ms": round(self.max_latency * 1000, 3),
+            }
+
+
+password_hash_pool = PasswordHashPool()
+
+
+async def hash_password_async(password: str) -> str:
+    return await password_hash_pool.run(hash_password, password)
+
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    return await password_hash_pool.run(verify_and_update_password, plain_password, hashed_password)
@@ -0,0 +1,306 @@
+from abc import ABC, abstractmethod
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+from app.core.config import settings
+from app.db.database import get_sessionmaker
+from app.models.models import IdempotencyKey
+
+HEADER = "idempotency-key"
+MAX_KEY_LENGTH = 255
+
+
+@dataclass
+class StoredResponse:
+    status_code: int
+    headers: list[tuple[str, str]]
+    body: bytes
+
+
+class IdempotencyKeyMismatch(Exception):
+    pass
+
+
+class IdempotencyKeyInProgress(Exception):
+    pass
+
+
+class IdempotencyStore(ABC):
+    """
+    Remembers the response given to every idempotency key for idempotency_ttl_seconds.
+
+    claim() returns the stored response of a completed key, or None once the caller holds the key
+    and has to run the request; it is then ended with complete() or, when the request failed,
+    release() so that a retry runs it again. A key held by another request is waited for, at most
+    idempotency_wait_timeout seconds.
+    """
+
+    @abstractmethod
+    async def claim(self, key: str, fingerprint: str) -> StoredResponse | None:
+        ...
+
+    @abstractmethod
+    async def complete(self, key: str, response: StoredResponse):
+        ...
+
+    @abstractmethod
+    async def release(self, key: str):
+        ...
+
+
+@dataclass
+class _Entry:
+    fingerprint: str
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+    response: StoredResponse | None = None
+    expires_at: float = 0.0
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """
+    Keys kept in process memory: only retries reaching the same process are deduplicated.
+    """
+
+    def __init__(self, max_entries: int = None):
+        self._max_entries = max_entries
+        # Completed keys are moved to the end, so the oldest ones are always first.
+        self._entries = OrderedDict()
+
+    @property
+    def max_entries(self) -> int:
+        return self._max_entries if self._max_entries is not None else settings.idempotency_max_entries
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if entry.response is None or (entry.expires_at > now and len(self._entries) <= self.max_entries):
+                return
+            self._entries.popitem(last=False)
+
+    async def claim(self, key: str, fingerprint: str) -> StoredResponse | None:
+        deadline = time.monotonic() + settings.idempotency_wait_timeout
+        while True:
+            self._evict()
+            entry = self._entries.get(key)
+            if entry is None or (entry.response is not None and entry.expires_at <= time.monotonic()):
+                self._entries[key] = _Entry(fingerprint)
+                return None
+            if entry.fingerprint != fingerprint:
+                raise IdempotencyKeyMismatch()
+            if entry.response is not None:
+                return entry.response
+            try:
+                await asyncio.wait_for(entry.done.wait(), max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                raise IdempotencyKeyInProgress()
+
+    async def complete(self, key: str, response: StoredResponse):
+        entry = self._entries[key]
+        entry.response = response
+        entry.expires_at = time.monotonic() + settings.idempotency_ttl_seconds
+        self._entries.move_to_end(key)
+        entry.done.set()
+
+    async def release(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry.done.set()
+
+
+class DatabaseIdempotencyStore(IdempotencyStore):
+    """
+    Keys kept in the idempotency_keys table, shared by every process of the app. A key is held by
+    inserting its row; a row whose holder died is taken over once its lock expired.
+    """
+
+    purge_interval = 60
+
+    def __init__(self):
+        self._purged_at = 0.0
+
+    async def _purge(self, db):
+        # Expired rows are deleted at most once per interval and process.
+        if time.monotonic() - self._purged_at < self.purge_interval:
+            return
+        self._purged_at = time.monotonic()
+        await db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at < datetime.now(timezone.utc)))
+        await db.commit()
+
+    async def _try_claim(self, db, key: str, fingerprint: str) -> bool:
+        now = datetime.now(timezone.utc)
+        values = {
+            "fingerprint": fingerprint,
+            "status_code": None,
+            "headers": None,
+            "body": None,
+            "locked_until": now + timedelta(seconds=settings.idempotency_lock_timeout),
+            "expires_at": now + timedelta(seconds=settings.idempotency_ttl_seconds),
+        }
+        try:
+            await db.execute(insert(IdempotencyKey).values(key=key, **values))
+            await db.commit()
+            return True
+        except IntegrityError:
+            await db.rollback()
+        # The row exists: take it over if it expired or its holder stopped working on it.
+        result = await db.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.key == key, or_(
+                IdempotencyKey.expires_at <= now,
+                (IdempotencyKey.status_code.is_(None)) & (IdempotencyKey.locked_until <= now),
+            ))
+            .values(**values)
+        )
+        await db.commit()
+        return result.rowcount == 1
+
+    async def claim(self, key: str, fingerprint: str) -> StoredResponse | None:
+        deadline = time.monotonic() + settings.idempotency_wait_timeout
+        delay = 0.02
+        while True:
+            async with get_sessionmaker()() as db:
+                await self._purge(db)
+                if await self._try_claim(db, key, fingerprint):
+                    return None
+                row = (await db.execute(select(IdempotencyKey).filter(IdempotencyKey.key == key))).scalar_one_or_none()
+            if row is not None:
+                if row.fingerprint != fingerprint:
+                    raise IdempotencyKeyMismatch()
+                if row.status_code is not None:
+                    return StoredResponse(row.status_code, [tuple(header) for header in row.headers], row.body)
+            # Held by another request, poll until it completes.
+            if time.monotonic() + delay > deadline:
+                raise IdempotencyKeyInProgress()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+    async def complete(self, key: str, response: StoredResponse):
+        async with get_sessionmaker()() as db:
+            await db.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.key == key)
+                .values(
+                    status_code=response.status_code,
+                    headers=[list(header) for header in response.headers],
+                    body=response.body,
+                    expires_at=datetime.now(timezone.utc) + timedelta(seconds=settings.idempotency_ttl_seconds),
+                )
+            )
+            await db.commit()
+
+    async def release(self, key: str):
+        async with get_sessionmaker()() as db:
+            await db.execute(
+                delete(IdempotencyKey).where(IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None)))
+            await db.commit()
+
+
+@lru_cache
+def get_idempotency_store() -> IdempotencyStore:
+    if settings.idempotency_store == "memory":
+        return MemoryIdempotencyStore()
+    if settings.idempotency_store == "database":
+        return DatabaseIdempotencyStore()
+    raise ValueError(f"Unknown idempotency store {settings.idempotency_store!r}, expected memory or database")
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware making the given (method, path) routes safe to retry: a request sent again with
+    the same Idempotency-Key header gets the first response replayed instead of running again.
+    Keys are scoped to the route and the Authorization header; reusing one with another body is
+    rejected with 422. Server errors are not stored, so a retry after a 5xx runs the request again.
+    """
+
+    def __init__(self, app, routes: set[tuple[str, str]], store: IdempotencyStore = None):
+        self.app = app
+        self.routes = routes
+        self._store = store
+
+    @property
+    def store(self) -> IdempotencyStore:
+        return self._store or get_idempotency_store()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (scope["method"], scope["path"]) not in self.routes:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get(HEADER)
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            await JSONResponse({"detail": "Invalid Idempotency-Key header"}, status_code=400)(scope, receive, send)
+            return
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        scoped_key = "\n".join((scope["method"], scope["path"], headers.get("authorization", ""), idempotency_key))
+        key = hashlib.sha256(scoped_key.encode()).hexdigest()
+
+        try:
+            stored = await self.store.claim(key, hashlib.sha256(body).hexdigest())
+        except IdempotencyKeyMismatch:
+            detail = "Idempotency-Key was already used with another request body"
+            await JSONResponse({"detail": detail}, status_code=422)(scope, receive, send)
+            return
+        except IdempotencyKeyInProgress:
+            detail = "A request with this Idempotency-Key is still being processed"
+            await JSONResponse({"detail": detail}, status_code=409)(scope, receive, send)
+            return
+        if stored is not None:
+            await send({
+                "type": "http.response.start",
+                "status": stored.status_code,
+                "headers": [(name.encode("latin-1"), value.encode("latin-1")) for name, value in stored.headers]
+                + [(b"idempotent-replayed", b"true")],
+            })
+            await send({"type": "http.response.body", "body": stored.body})
+            return
+
+        # The body was consumed above, the app reads it again from here.
+        body_sent = False
+
+        async def receive_wrapper():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        response = StoredResponse(500, [], b"")
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response.status_code = message["status"]
+                response.headers = [
+                    (name.decode("latin-1"), value.decode("latin-1")) for name, value in message.get("headers", [])]
+            elif message["type"] == "http.response.body":
+                response.body += message.get("body", b"")
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        except BaseException:
+            await self.store.release(key)
+            raise
+        if response.status_code < 500:
+            await self.store.complete(key, response)
+        else:
+            await self.store.release(key)
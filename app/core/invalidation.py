@@ -0,0 +1,117 @@
+import asyncio
+import json
+import logging
+import uuid
+
+from sqlalchemy import make_url, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.core.config import settings
+from app.db.database import get_engine
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two pings of the listening connection, so a silently dropped one is noticed.
+KEEPALIVE_SECONDS = 30
+MAX_RECONNECT_DELAY = 30
+
+
+class InvalidationBus:
+    """
+    Spreads the invalidations of the in-process caches to every worker of every pod.
+
+    Services publish an entity and its key after committing a change: the local entries are evicted
+    at once, and the message goes out with Postgres NOTIFY. Every worker runs listen() on its own
+    connection and evicts its entries when a message of another worker arrives. Notifications sent
+    while a worker was disconnected are lost, so it drops its whole caches when it reconnects.
+    On other databases invalidations stay local and the other workers rely on the cache TTL.
+    """
+
+    def __init__(self):
+        # Tells this worker's messages apart, they were already applied when published.
+        self.origin = uuid.uuid4().hex
+        self._handlers = {}
+        self._caches = []
+
+    def register(self, entity: str, handler, *caches):
+        """
+        Utility registering the function evicting the local entries of an entity given its key,
+        and the caches holding them.
+        """
+        self._handlers[entity] = handler
+        self._caches.extend(cache for cache in caches if cache not in self._caches)
+
+    @property
+    def enabled(self) -> bool:
+        return settings.cache_invalidation_enabled and get_engine().dialect.name == "postgresql"
+
+    def evict(self, entity: str, key=None):
+        self._handlers[entity](key)
+
+    def reset(self):
+        for cache in self._caches:
+            cache.clear()
+
+    async def publish(self, entity: str, key=None):
+        self.evict(entity, key)
+        if not self.enabled:
+            return
+        payload = json.dumps({"origin": self.origin, "entity": entity, "key": key})
+        try:
+            async with get_engine().connect() as conn:
+                await conn.execute(
+                    text("SELECT pg_notify(:channel, :payload)"),
+                    {"channel": settings.cache_invalidation_channel, "payload": payload},
+                )
+                await conn.commit()
+        except (OSError, SQLAlchemyError) as e:
+            logger.warning(f"Cache invalidation of {entity} {key} not broadcast: {e.__class__.__name__}: {e}")
+
+    def _on_notification(self, connection, pid, channel, payload):
+        try:
+            message = json.loads(payload)
+            if message["origin"] != self.origin:
+                self.evict(message["entity"], message["key"])
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignored malformed cache invalidation {payload!r}: {e.__class__.__name__}: {e}")
+
+    @staticmethod
+    def listener_dsn() -> str:
+        # The listener talks to asyncpg directly, outside of the pool it would hold a connection of.
+        return make_url(settings.async_database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+    async def listen(self):
+        """
+        Background task of the app applying the invalidations of the other workers, reconnecting with backoff.
+        """
+        import asyncpg
+
+        delay = 1
+        while True:
+            try:
+                connection = await asyncpg.connect(self.listener_dsn())
+            except (OSError, asyncpg.PostgresError) as e:
+                logger.warning(f"Cache invalidation listener can not connect, retrying in {delay}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+                continue
+
+            delay = 1
+            closed = asyncio.Event()
+            connection.add_termination_listener(lambda _: closed.set())
+            try:
+                await connection.add_listener(settings.cache_invalidation_channel, self._on_notification)
+                self.reset()
+                while not closed.is_set():
+                    try:
+                        await asyncio.wait_for(closed.wait(), timeout=KEEPALIVE_SECONDS)
+                    except asyncio.TimeoutError:
+                        await connection.execute("SELECT 1")
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                logger.warning(f"Cache invalidation listener disconnected, reconnecting: {e.__class__.__name__}: {e}")
+            finally:
+                if not connection.is_closed():
+                    await connection.close()
+
+
+invalidation_bus = InvalidationBus()
@@ -0,0 +1,164 @@
+import threading
+import time
+from contextvars import ContextVar
+from collections import Counter
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """
+    Prometheus style histogram with one series per label set, kept in process memory.
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: tuple, buckets: tuple):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                label_text = ",".join(f'{name}="{escape(value)}"' for name, value in zip(self.label_names, labels))
+                prefix = label_text + "," if label_text else ""
+                for bound, count in zip(self.buckets, series["buckets"]):
+                    lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series["count"]}')
+                lines.append(f"{self.name}_sum{{{label_text}}} {series['sum']}")
+                lines.append(f"{self.name}_count{{{label_text}}} {series['count']}")
+        return lines
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+ROUTE_LABELS = ("method", "route", "status")
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Time spent handling the request.", ROUTE_LABELS, LATENCY_BUCKETS)
+request_db_statements = Histogram(
+    "http_request_db_statements", "Database statements executed by the request.", ROUTE_LABELS, STATEMENT_BUCKETS)
+request_db_duration = Histogram(
+    "http_request_db_duration_seconds", "Time the request spent executing database statements.", ROUTE_LABELS, LATENCY_BUCKETS)
+response_size = Histogram(
+    "http_response_size_bytes", "Size of the response body.", ROUTE_LABELS, SIZE_BUCKETS)
+
+histograms = [request_duration, request_db_statements, request_db_duration, response_size]
+
+
+def render_metrics() -> str:
+    lines = []
+    for histogram in histograms:
+        lines.extend(histogram.expose())
+    return "\n".join(lines) + "\n"
+
+
+# Database work of the request being handled, filled in by the engine hooks below.
+@dataclass
+class RequestStats:
+    method: str = ""
+    path: str = ""
+    db_statements: int = 0
+    db_time: float = 0.0
+    # Executions of each statement fingerprint, used to spot N+1 query patterns.
+    fingerprints: Counter = field(default_factory=Counter)
+
+
+current_request_stats: ContextVar[RequestStats | None] = ContextVar("current_request_stats", default=None)
+
+
+def instrument_engine(engine, *observers):
+    """
+    Times every statement the engine executes once, counts the statements and database time of the
+    current request, then hands the statement and its duration to the observers, e.g. the query diagnostics,
+    as observer(conn, statement, parameters, executemany, elapsed).
+    """
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+        stats = current_request_stats.get()
+        if stats is not None:
+            stats.db_statements += 1
+            stats.db_time += elapsed
+        for observer in observers:
+            observer(conn, statement, parameters, executemany, elapsed)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_start_time"):
+            connection.info["query_start_time"].pop()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency, database statements, database time and response size per route
+    template, and sending them back in a Server-Timing header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(method=scope["method"], path=scope["path"])
+        token = current_request_stats.set(stats)
+        start = time.perf_counter()
+        status_code = 500
+        body_size = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, body_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                server_timing = (
+                    f'app;dur={elapsed_ms:.2f}, '
+                    f'db;dur={stats.db_time * 1000:.2f};desc="{stats.db_statements} statements"'
+                )
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"server-timing", server_timing.encode())]
+            elif message["type"] == "http.response.body":
+                body_size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request_stats.reset(token)
+            route = scope.get("route")
+            labels = (scope["method"], getattr(route, "path", "<unmatched>"), str(status_code))
+            request_duration.observe(labels, time.perf_counter() - start)
+            request_db_statements.observe(labels, stats.db_statements)
+            request_db_duration.observe(labels, stats.db_time)
+            response_size.observe(labels, body_size)
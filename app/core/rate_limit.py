@@ -0,0 +1,226 @@
+from abc import ABC, abstractmethod
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable
+from urllib.parse import parse_qs
+
+from fastapi import HTTPException
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+from app.core.config import settings
+from app.core.security import decode_token
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RouteGroup:
+    """
+    Requests sharing one token bucket per client: burst requests at once, then refill per second.
+    Limits not given explicitly are read from the rate_limit_<name>_burst / _refill settings.
+    """
+    name: str
+    matches: Callable[[dict], bool]
+    # Anonymous requests are always limited per IP; per_user groups limit signed in users per user.
+    per_user: bool = True
+    burst: int = None
+    refill: float = None
+
+    def __post_init__(self):
+        # An empty bucket would never refill, and its retry delay divides by the refill rate.
+        if self.refill is not None and self.refill <= 0:
+            raise ValueError(f"Refill rate of the {self.name} route group must be positive")
+
+    @property
+    def capacity(self) -> int:
+        return self.burst if self.burst is not None else getattr(settings, f"rate_limit_{self.name}_burst")
+
+    @property
+    def refill_rate(self) -> float:
+        return self.refill if self.refill is not None else getattr(settings, f"rate_limit_{self.name}_refill")
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    remaining: float
+    retry_after: float = 0.0
+
+
+class RateLimitBackend(ABC):
+    @abstractmethod
+    async def take(self, key: str, capacity: int, refill_rate: float, cost: int = 1) -> Decision:
+        ...
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    Buckets kept in process memory, every process limits its clients on its own. The least
+    recently used buckets are dropped beyond max_keys; a dropped bucket was refilled anyway.
+    """
+
+    def __init__(self, max_keys: int = None):
+        self._max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def max_keys(self) -> int:
+        return self._max_keys if self._max_keys is not None else settings.rate_limit_max_keys
+
+    async def take(self, key: str, capacity: int, refill_rate: float, cost: int = 1) -> Decision:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * refill_rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return Decision(allowed, tokens, 0.0 if allowed else (cost - tokens) / refill_rate)
+
+
+# Refills and takes from the bucket in one step on the Redis server, using its clock so that
+# every app instance agrees on the time. Idle buckets expire once they would be full again.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * refill_rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / refill_rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """
+    Buckets shared by every app instance in Redis. Takes any redis.asyncio client, e.g. one of
+    fakeredis or a local redis-server in tests. When Redis is unreachable requests are let through.
+    """
+
+    def __init__(self, client=None, prefix: str = "rate_limit:"):
+        self._client = client
+        self._script = None
+        self.prefix = prefix
+
+    @property
+    def client(self):
+        if self._client is None:
+            # Imported here, only the shared backend needs the redis package.
+            import redis.asyncio
+
+            self._client = redis.asyncio.from_url(settings.rate_limit_redis_url)
+        return self._client
+
+    async def take(self, key: str, capacity: int, refill_rate: float, cost: int = 1) -> Decision:
+        from redis.exceptions import RedisError
+
+        if self._script is None:
+            self._script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+        try:
+            allowed, tokens = await self._script(keys=[self.prefix + key], args=[capacity, refill_rate, cost])
+        except (OSError, RedisError) as e:
+            logger.warning(f"Rate limit store not reachable, request let through: {e.__class__.__name__}: {e}")
+            return Decision(True, capacity)
+        tokens = float(tokens)
+        return Decision(bool(allowed), tokens, 0.0 if allowed else (cost - tokens) / refill_rate)
+
+
+@lru_cache
+def get_rate_limit_backend() -> RateLimitBackend:
+    if settings.rate_limit_backend == "memory":
+        return MemoryRateLimitBackend()
+    if settings.rate_limit_backend == "redis":
+        return RedisRateLimitBackend()
+    raise ValueError(f"Unknown rate limit backend {settings.rate_limit_backend!r}, expected memory or redis")
+
+
+def is_search(scope) -> bool:
+    return scope["method"] == "GET" and scope["path"] == "/products/" and bool(
+        parse_qs(scope["query_string"].decode("latin-1")).get("search"))
+
+
+# The first matching group applies. Login and signup run bcrypt and search scans the catalog,
+# they get tighter limits than the rest of the API.
+ROUTE_GROUPS = [
+    RouteGroup("auth", lambda scope: scope["method"] == "POST" and scope["path"] in ("/auth/token", "/auth/signup"),
+               per_user=False),
+    RouteGroup("search", is_search),
+    RouteGroup("default", lambda scope: True),
+]
+
+EXEMPT_PATHS = {"/metrics", "/docs", "/redoc", "/openapi.json"}
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware limiting every client with token buckets per route group. Clients are the
+    user of a valid bearer token (its sub claim), otherwise the IP address. Requests over the
+    limit get a 429 with a Retry-After header and never reach the app.
+    """
+
+    def __init__(self, app, groups: list[RouteGroup] = None, backend: RateLimitBackend = None):
+        self.app = app
+        self.groups = groups or ROUTE_GROUPS
+        self._backend = backend
+
+    @property
+    def backend(self) -> RateLimitBackend:
+        return self._backend or get_rate_limit_backend()
+
+    @staticmethod
+    def client_ip(scope, headers: Headers) -> str:
+        if settings.rate_limit_trust_forwarded_for and (forwarded_for := headers.get("x-forwarded-for")):
+            return forwarded_for.split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    @staticmethod
+    def user(headers: Headers) -> str | None:
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return None
+        try:
+            return decode_token(token)["sub"]
+        except HTTPException:
+            return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.rate_limit_enabled or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        group = next(group for group in self.groups if group.matches(scope))
+        headers = Headers(scope=scope)
+        user = self.user(headers) if group.per_user else None
+        client = f"user:{user}" if user is not None else f"ip:{self.client_ip(scope, headers)}"
+
+        decision = await self.backend.take(f"{group.name}:{client}", group.capacity, group.refill_rate)
+        if not decision.allowed:
+            response = JSONResponse(
+                {"detail": "Too many requests, retry later"},
+                status_code=429,
+                headers={"Retry-After": str(math.ceil(decision.retry_after))},
+            )
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
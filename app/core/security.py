@@ -1,31 +1,66 @@
+from dataclasses import dataclass
 from datetime import datetime, timezone, timedelta
+from functools import lru_cache
 from typing import Annotated
 
 import jwt
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from jwt import InvalidTokenError
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
+from app.core.cache import TTLCache
 from app.core.config import settings
-from app.db.database import get_db
+from app.core.invalidation import invalidation_bus
+from app.db.database import get_async_db
 from app.models.models import User
 
-# Password context for handling password hashing and verification mechanims
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Password context for handling password hashing and verification mechanims,
+# built on the first hash so that passlib is not loaded at import.
+@lru_cache
+def get_pwd_context():
+    from passlib.context import CryptContext
+
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=settings.bcrypt_rounds,
+        bcrypt__min_rounds=settings.bcrypt_rounds,
+        bcrypt__max_rounds=settings.bcrypt_rounds,
+    )
+
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
 
+# The authenticated user as needed by authorization and ownership checks.
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    username: str
+    role: str
+
+
+# Principals by user id, so most authenticated requests need no users query.
+principal_cache = TTLCache("principals", ttl_setting="principal_cache_ttl_seconds")
+
+
 # Create Hash Password
 def hash_password(password) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 
 # Verify Hash Password
 def verify_password(plain_password, hashed_password) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
+
+
+# Verify Hash Password, also returning a new hash when the stored one uses outdated cost parameters
+def verify_and_update_password(plain_password, hashed_password) -> tuple[bool, str | None]:
+    return get_pwd_context().verify_and_update(plain_password, hashed_password)
 
 
 # Creation of access token
@@ -40,26 +75,66 @@ async def create_access_token(data: dict, expire_delta: timedelta | None = None)
     return jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
 
 
-async def get_username_from_token(token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
+def credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def decode_token(token: str) -> dict:
     try:
         payload = jwt.decode(token, settings.secret_key, settings.algorithm)
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
     except InvalidTokenError:
-        raise credentials_exception
-    return username
+        raise credentials_exception()
+    if payload.get("sub") is None:
+        raise credentials_exception()
+    return payload
+
+
+async def get_username_from_token(token: str = Depends(oauth2_scheme)):
+    return decode_token(token)["sub"]
+
+
+async def get_principal_from_token(token: str, db: AsyncSession) -> Principal:
+    """
+    Resolves the user of a token. Tokens carry the user id only, the role comes from the database: the principal
+    is served from a short lived cache so a demoted or deleted user is noticed within principal_cache_ttl_seconds.
+    """
+    payload = decode_token(token)
+    user_id = payload.get("uid")
+    if user_id is not None:
+        principal = principal_cache.get(user_id)
+        if principal is not None:
+            return principal
+        db_user = await db.get(User, user_id)
+    else:
+        # Tokens issued before the id claim existed only carry the username.
+        result = await db.execute(select(User).filter(User.username == payload["sub"]))
+        db_user = result.scalars().first()
+
+    if not db_user:
+        raise credentials_exception()
+    principal = Principal(id=db_user.id, username=db_user.username, role=db_user.role)
+    principal_cache.set(principal.id, principal)
+    return principal
+
+
+async def invalidate_principal(user_id: int):
+    # Evicts here and in every other worker, so a demoted or deleted user loses access everywhere at once.
+    await invalidation_bus.publish("principals", user_id)
+
+
+invalidation_bus.register("principals", principal_cache.delete, principal_cache)
+
+
+async def get_current_principal(token: Annotated[str, Depends(oauth2_scheme)], db: AsyncSession = Depends(get_async_db)):
+    return await get_principal_from_token(token, db)
 
 
 # Check Admin Role
-async def check_admin_role(token: Annotated[str, Depends(oauth2_scheme)], db: Session = Depends(get_db)):
-    active_user_username = await get_username_from_token(token)
-    db_active_user = db.query(User).filter(User.username == active_user_username).first()
-    if db_active_user.role != 'admin':
+async def check_admin_role(principal: Annotated[Principal, Depends(get_current_principal)]):
+    if principal.role != 'admin':
         raise HTTPException(status_code=403, detail="Admin role is required.")
 
@@ -1,25 +1,155 @@
-from sqlalchemy import create_engine, false
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+import asyncio
+import logging
+import threading
+
+from fastapi import Request
+from sqlalchemy import Delete, Insert, Select, Update, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, declarative_base
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.core.metrics import instrument_engine
+from app.db.diagnostics import observe_statement
+from app.db.pool import InstrumentedAsyncQueuePool
 
-DB_URL = f"postgresql://{settings.db_username}:{settings.db_password}@{settings.db_hostname}:{settings.db_port}/{settings.db_name}"
+logger = logging.getLogger(__name__)
 
-# Establish a connection to a postgresql instance
-engine = create_engine(DB_URL)
+Base = declarative_base()
 
+# Every engine of the application, reported by the pool statistics endpoint.
+# Engines are created on first use (the lifespan handler at startup), never at import.
+engines = {}
+_sessionmakers = {}
+_lock = threading.Lock()
 
-# Create database tables based on the sqlAlchemy models
-Base = declarative_base()
-Base.metadata.create_all(bind=engine)
 
-# Connect to the database and provide a session for interacting with it
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def engine_options(url: str) -> dict:
+    # sqlite keeps the default pool of its driver, the pool settings only apply to server databases.
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "poolclass": InstrumentedAsyncQueuePool,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
 
 
-def get_db() -> SessionLocal:
-    db = SessionLocal()
-    try:
+def create_engine(url: str):
+    # Establish a connection to the database through an async driver (asyncpg / aiosqlite)
+    engine = create_async_engine(url, **engine_options(url))
+    # Statements and database time are attributed to the request that issued them,
+    # slow statements and N+1 patterns are logged as they happen.
+    instrument_engine(engine, observe_statement)
+    return engine
+
+
+def get_engine():
+    """
+    Utility returning the primary engine, created on the first call so that importing the
+    application neither reads the settings nor loads the database driver.
+    """
+    if "primary" not in engines:
+        with _lock:
+            if "primary" not in engines:
+                engines["primary"] = create_engine(settings.async_database_url)
+    return engines["primary"]
+
+
+# Clients that wrote recently, their reads stay on the primary so they see their own writes.
+recent_writers = TTLCache(
+    "recent_writers", max_entries_setting="read_your_writes_max_clients", ttl_setting="read_your_writes_seconds")
+
+
+def is_write(clause) -> bool:
+    if isinstance(clause, (Insert, Update, Delete)):
+        return True
+    # SELECT ... FOR UPDATE locks rows of the primary.
+    return isinstance(clause, Select) and clause._for_update_arg is not None
+
+
+class RoutingSession(Session):
+    """
+    Session sending every statement to the primary, except the reads of a session given a
+    replica in info["replica"] (see app.db.replicas.get_read_db). A session stays on the primary
+    once it wrote, and its client (info["client"]) is remembered in recent_writers.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if not self.info.get("wrote") and (self._flushing or is_write(clause)):
+            self.info["wrote"] = True
+            if self.info.get("client") is not None:
+                recent_writers.set(self.info["client"], True)
+        replica = self.info.get("replica")
+        if replica is not None and not self.info.get("wrote"):
+            return replica
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+
+def get_sessionmaker() -> async_sessionmaker:
+    if "primary" not in _sessionmakers:
+        # Connect to the database and provide a session for interacting with it.
+        # Objects stay loaded after commit so they can still be serialized in the response.
+        _sessionmakers["primary"] = async_sessionmaker(
+            bind=get_engine(), class_=AsyncSession, sync_session_class=RoutingSession,
+            autoflush=False, expire_on_commit=False)
+    return _sessionmakers["primary"]
+
+
+def client_key(request: Request) -> str | None:
+    # The bearer token for signed in clients, the IP address otherwise.
+    return request.headers.get("authorization") or (request.client.host if request.client else None)
+
+
+def __getattr__(name):
+    # engine and AsyncSessionLocal remain importable, they are created when first accessed.
+    if name == "engine":
+        return get_engine()
+    if name == "AsyncSessionLocal":
+        return get_sessionmaker()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+async def get_async_db(request: Request):
+    async with get_sessionmaker()() as db:
+        db.info["client"] = client_key(request)
         yield db
-    finally:
-        db.close()
+
+
+async def check_database():
+    """
+    Opens the first pooled connection and checks the schema is at the latest migration.
+    Waits at most db_startup_timeout seconds: a slow or unreachable database is logged and the
+    app starts anyway, requests then retry the connection through the pool.
+    """
+    async def connect():
+        async with get_engine().connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            if not settings.db_check_schema_on_startup:
+                return None
+            try:
+                return await conn.scalar(text("SELECT version_num FROM alembic_version"))
+            except SQLAlchemyError:
+                return "<none>"
+
+    try:
+        version = await asyncio.wait_for(connect(), timeout=settings.db_startup_timeout)
+    except (asyncio.TimeoutError, OSError, SQLAlchemyError) as e:
+        logger.warning(f"Database not reachable at startup, continuing without it: {e.__class__.__name__}: {e}")
+        return
+
+    if version is not None:
+        # Imported here, only the startup check needs alembic.
+        from app.db.migrations import head_revision
+
+        head = head_revision()
+        if version != head:
+            logger.warning(f"Database schema is at revision {version}, the latest is {head}: run `alembic upgrade head`")
+
+
+async def dispose_engines():
+    for engine in engines.values():
+        await engine.dispose()
@@ -0,0 +1,104 @@
+import hashlib
+import logging
+import re
+from functools import lru_cache
+
+from app.core.config import settings
+from app.core.metrics import current_request_stats
+
+logger = logging.getLogger(__name__)
+
+MAX_LOGGED_PARAMETERS = 500
+EXPLAIN_SAVEPOINT = "slow_query_explain"
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+PLACEHOLDER = re.compile(r"\$\d+|%\(\w+\)s|%s|:\w+|\?")
+IN_LIST = re.compile(r"\bIN \(\?(?:, \?)*\)", re.IGNORECASE)
+WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def normalize_statement(statement: str) -> str:
+    """
+    Utility to reduce a statement to its shape: literals and bound parameters become ?, IN lists of any length
+    become IN (...), so the same query with other values or another number of ids gets the same fingerprint.
+    """
+    normalized = WHITESPACE.sub(" ", statement).strip()
+    normalized = STRING_LITERAL.sub("?", normalized)
+    normalized = PLACEHOLDER.sub("?", normalized)
+    normalized = NUMBER_LITERAL.sub("?", normalized)
+    return IN_LIST.sub("IN (...)", normalized)
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(statement: str) -> str:
+    return hashlib.sha1(normalize_statement(statement).encode()).hexdigest()[:12]
+
+
+def explain(conn, statement: str, parameters) -> str:
+    """
+    Utility to fetch the query plan of a statement on the connection that just ran it,
+    through a raw cursor so it is not counted or logged itself. On Postgres it runs inside
+    a savepoint when a transaction is open, a failing EXPLAIN would abort the request's transaction.
+    """
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    savepoint = conn.dialect.name == "postgresql" and conn.in_transaction()
+    cursor = conn.connection.cursor()
+    try:
+        if savepoint:
+            cursor.execute(f"SAVEPOINT {EXPLAIN_SAVEPOINT}")
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        except Exception:
+            if savepoint:
+                cursor.execute(f"ROLLBACK TO SAVEPOINT {EXPLAIN_SAVEPOINT}")
+            raise
+        if savepoint:
+            cursor.execute(f"RELEASE SAVEPOINT {EXPLAIN_SAVEPOINT}")
+        return "\n".join("  " + " | ".join(map(str, row)) for row in rows)
+    finally:
+        cursor.close()
+
+
+def log_slow_query(conn, statement: str, parameters, executemany: bool, elapsed: float):
+    logged_parameters = repr(parameters)
+    if len(logged_parameters) > MAX_LOGGED_PARAMETERS:
+        logged_parameters = logged_parameters[:MAX_LOGGED_PARAMETERS] + "..."
+    message = (
+        f"Slow query {elapsed * 1000:.1f} ms [{fingerprint(statement)}] {normalize_statement(statement)}\n"
+        f"  parameters: {logged_parameters}"
+    )
+
+    # Only plain reads are explained, the plan of a write is rarely the problem and a batch has no single plan.
+    if settings.slow_query_explain and not executemany and statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        try:
+            message += "\n  plan:\n" + explain(conn, statement, parameters)
+        except Exception as e:
+            message += f"\n  plan: unavailable ({e.__class__.__name__}: {e})"
+    logger.warning(message)
+
+
+def check_n_plus_one(statement: str):
+    stats = current_request_stats.get()
+    if stats is None:
+        return
+    key = fingerprint(statement)
+    stats.fingerprints[key] += 1
+    # Reported once per request, when the statement goes over the threshold.
+    if stats.fingerprints[key] == settings.n_plus_one_threshold + 1:
+        logger.warning(
+            f"Possible N+1 query: {stats.method} {stats.path} ran the same statement more than "
+            f"{settings.n_plus_one_threshold} times [{key}] {normalize_statement(statement)}"
+        )
+
+
+def observe_statement(conn, statement: str, parameters, executemany: bool, elapsed: float):
+    """
+    Statement observer of instrument_engine logging slow statements and repeated statements of a request.
+    """
+    if settings.slow_query_threshold_ms and elapsed * 1000 >= settings.slow_query_threshold_ms:
+        log_slow_query(conn, statement, parameters, executemany, elapsed)
+    if settings.n_plus_one_threshold:
+        check_n_plus_one(statement)
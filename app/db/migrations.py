@@ -0,0 +1,30 @@
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+
+ALEMBIC_INI = Path(__file__).resolve().parents[2] / "alembic.ini"
+
+
+def alembic_config() -> Config:
+    config = Config(str(ALEMBIC_INI))
+    # Keep the logging of the calling process, alembic.ini only configures the alembic command line.
+    config.attributes["configure_logger"] = False
+    return config
+
+
+def upgrade_database(revision: str = "head"):
+    """
+    Utility applying the migrations up to revision, the programmatic `alembic upgrade head`.
+    Runs its own event loop, call it through asyncio.to_thread from async code.
+    """
+    command.upgrade(alembic_config(), revision)
+
+
+def downgrade_database(revision: str = "base"):
+    command.downgrade(alembic_config(), revision)
+
+
+def head_revision() -> str:
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
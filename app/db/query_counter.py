@@ -0,0 +1,109 @@
+import functools
+import inspect
+from collections import Counter
+
+from sqlalchemy import event
+
+from app.db.database import get_engine
+from app.db.diagnostics import fingerprint, normalize_statement
+
+
+class QueryCounter:
+    """
+    Records every statement sent to the database while the context is active.
+
+    with QueryCounter() as counter:
+        client.get("/products/")
+    assert counter.count <= 2, counter.statements
+    """
+
+    def __init__(self, engine=None):
+        self.engine = (engine or get_engine()).sync_engine
+        self.statements = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def fingerprints(self) -> Counter:
+        return Counter(fingerprint(statement) for statement in self.statements)
+
+    def repeated(self, max_repeats: int) -> list[tuple[str, int]]:
+        """
+        Utility to list the statements run more than max_repeats times, the signature of an N+1.
+        """
+        counts = self.fingerprints
+        seen = set()
+        repeated = []
+        for statement in self.statements:
+            key = fingerprint(statement)
+            if counts[key] > max_repeats and key not in seen:
+                seen.add(key)
+                repeated.append((normalize_statement(statement), counts[key]))
+        return repeated
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, "before_cursor_execute", self._before_cursor_execute)
+
+
+class QueryBudget:
+    """
+    Fails when the wrapped block runs more than limit statements, e.g. an endpoint
+    that started lazy loading a relationship for every row it serializes, or runs one
+    statement more than max_repeats times. Works as a context manager and as a decorator
+    of sync and async functions.
+
+    with QueryBudget(3):
+        client.get("/cart/1", headers=headers)
+
+    @QueryBudget(2, max_repeats=1)
+    def test_list_products(): ...
+    """
+
+    def __init__(self, limit: int, max_repeats: int = None, engine=None):
+        self.limit = limit
+        self.max_repeats = max_repeats
+        self.engine = engine
+        self.counter = None
+
+    def __enter__(self) -> QueryCounter:
+        self.counter = QueryCounter(self.engine).__enter__()
+        return self.counter
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.counter.__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return
+        counter = self.counter
+        if counter.count > self.limit:
+            statements = "\n".join(f"  {index}. {statement}" for index, statement in enumerate(counter.statements, 1))
+            raise AssertionError(f"Expected at most {self.limit} queries, {counter.count} were executed:\n{statements}")
+        if self.max_repeats is not None and (repeated := counter.repeated(self.max_repeats)):
+            statements = "\n".join(f"  {count}x {statement}" for statement, count in repeated)
+            raise AssertionError(f"Expected no statement to run more than {self.max_repeats} times:\n{statements}")
+
+    def __call__(self, function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with QueryBudget(self.limit, self.max_repeats, self.engine):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with QueryBudget(self.limit, self.max_repeats, self.engine):
+                return function(*args, **kwargs)
+        return wrapper
+
+
+def assert_max_queries(limit: int, engine=None, max_repeats: int = None) -> QueryBudget:
+    return QueryBudget(limit, max_repeats, engine)
@@ -0,0 +1,156 @@
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from fastapi import Request
+from sqlalchemy import event, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import settings
+from app.db.database import client_key, create_engine, engines, get_sessionmaker, recent_writers
+
+logger = logging.getLogger(__name__)
+
+# Seconds the replica is behind the primary. A replica that replayed everything it received is
+# not behind, even when the primary has been idle since its last transaction.
+LAG_QUERIES = {
+    "postgresql": """
+        SELECT CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END
+    """,
+}
+# Databases without streaming replication, e.g. sqlite copies for local runs, are never behind.
+DEFAULT_LAG_QUERY = "SELECT 0"
+
+
+@dataclass
+class Replica:
+    name: str
+    engine: AsyncEngine
+    # Replicas are used until a check finds them unreachable or behind.
+    healthy: bool = True
+    lag: float | None = None
+    error: str | None = None
+    checked_at: datetime | None = None
+
+    def stats(self) -> dict:
+        return {
+            "replica": self.name,
+            "healthy": self.healthy,
+            "lag_seconds": self.lag,
+            "error": self.error,
+            "checked_at": self.checked_at,
+        }
+
+
+_replicas = None
+_lock = threading.Lock()
+_round_robin = itertools.count()
+
+
+def get_replicas() -> list[Replica]:
+    """
+    Utility returning the configured replicas, their engines are created on the first call.
+    """
+    global _replicas
+    if _replicas is None:
+        with _lock:
+            if _replicas is None:
+                _replicas = [create_replica(f"replica{index + 1}", url)
+                             for index, url in enumerate(settings.replica_database_urls)]
+    return _replicas
+
+
+def create_replica(name: str, url: str) -> Replica:
+    engines[name] = create_engine(url)
+    replica = Replica(name, engines[name])
+
+    # A lost connection takes the replica out of rotation at once, the next check brings it back.
+    @event.listens_for(replica.engine.sync_engine, "handle_error")
+    def handle_error(exception_context):
+        if exception_context.is_disconnect and replica.healthy:
+            replica.healthy = False
+            logger.warning(f"Read replica {name} disconnected, reads go to the primary until it recovers")
+
+    return replica
+
+
+async def check_replica(replica: Replica):
+    async def lag() -> float:
+        async with replica.engine.connect() as conn:
+            query = LAG_QUERIES.get(replica.engine.dialect.name, DEFAULT_LAG_QUERY)
+            return float(await conn.scalar(text(query)))
+
+    try:
+        replica.lag = await asyncio.wait_for(lag(), timeout=settings.replica_check_timeout)
+        replica.error = None
+    except (asyncio.TimeoutError, OSError, SQLAlchemyError) as e:
+        replica.lag, replica.error = None, f"{e.__class__.__name__}: {e}"
+    healthy = replica.error is None and replica.lag <= settings.replica_max_lag_seconds
+    if healthy != replica.healthy:
+        state = "back in rotation" if healthy else f"out of rotation ({replica.error or f'{replica.lag:.1f}s behind'})"
+        logger.warning(f"Read replica {replica.name} {state}")
+    replica.healthy = healthy
+    replica.checked_at = datetime.now(timezone.utc)
+
+
+async def check_replicas():
+    await asyncio.gather(*(check_replica(replica) for replica in get_replicas()))
+
+
+async def monitor_replicas():
+    """
+    Background task of the app checking the health and lag of every replica every replica_check_interval_seconds.
+    """
+    while True:
+        await asyncio.sleep(settings.replica_check_interval_seconds)
+        await check_replicas()
+
+
+def choose_replica() -> Replica | None:
+    healthy = [replica for replica in get_replicas() if replica.healthy]
+    if not healthy:
+        return None
+    return healthy[next(_round_robin) % len(healthy)]
+
+
+async def get_read_db(request: Request):
+    """
+    Session of the read-only routes. Its reads go to a healthy replica in turn, or to the primary
+    when none is healthy or when the client wrote within read_your_writes_seconds.
+    """
+    async with get_sessionmaker()() as db:
+        client = client_key(request)
+        db.info["client"] = client
+        if get_replicas() and recent_writers.get(client) is None:
+            replica = choose_replica()
+            if replica is not None:
+                db.info["replica"] = replica.engine.sync_engine
+                db.info["replica_state"] = replica
+                db.info["replica_opened_at"] = time.monotonic()
+        yield db
+
+
+def can_cache_reads(db, cache) -> bool:
+    """
+    Utility telling whether what the session read may fill the given cache. A replica may still
+    return the rows an invalidation of the cache was just published for, until it replays them
+    within its lag. Its reads are only cached when the session started more than the measured lag
+    (plus replica_lag_margin_seconds) after the last invalidation of that cache.
+    """
+    replica = db.info.get("replica_state")
+    if replica is None or db.info.get("wrote"):
+        return True
+    # Without a measured lag there is no telling how old the rows of the replica are.
+    if replica.lag is None:
+        return False
+    since_invalidation = db.info["replica_opened_at"] - cache.invalidated_at
+    return since_invalidation > replica.lag + settings.replica_lag_margin_seconds
@@ -0,0 +1,102 @@
+import re
+
+from sqlalchemy import DDL, Float, Index, event, false, func, literal_column, select, text, union_all
+
+from app.models.models import Product, Category
+
+# Text search configuration used both by the index and by the queries. It is rendered inline
+# because Postgres only uses an expression index when the query repeats the exact same expression.
+TS_CONFIG = text("'english'::regconfig")
+CATEGORY_MATCH_BOOST = 0.1
+
+
+def product_document():
+    """
+    Weighted tsvector of a product: title first, then brand, then description.
+    """
+    return (
+        func.setweight(func.to_tsvector(TS_CONFIG, Product.title), text("'A'"))
+        .op("||")(func.setweight(func.to_tsvector(TS_CONFIG, Product.brand), text("'B'")))
+        .op("||")(func.setweight(func.to_tsvector(TS_CONFIG, Product.description), text("'C'")))
+    )
+
+
+# GIN expression index serving the product search on Postgres.
+Index("ix_products_search", product_document(), postgresql_using="gin").ddl_if(dialect="postgresql")
+
+
+# On sqlite (local runs and tests) an FTS5 table is kept in sync with products and categories by triggers.
+SQLITE_FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts
+    USING fts5(title, brand, description, category, tokenize='porter unicode61')
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts (rowid, title, brand, description, category)
+        VALUES (new.id, new.title, new.brand, new.description, (SELECT name FROM categories WHERE id = new.category_id));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE ON products BEGIN
+        DELETE FROM products_fts WHERE rowid = old.id;
+        INSERT INTO products_fts (rowid, title, brand, description, category)
+        VALUES (new.id, new.title, new.brand, new.description, (SELECT name FROM categories WHERE id = new.category_id));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+        DELETE FROM products_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS categories_fts_update AFTER UPDATE OF name ON categories BEGIN
+        UPDATE products_fts SET category = new.name
+        WHERE rowid IN (SELECT id FROM products WHERE category_id = new.id);
+    END
+    """,
+]
+
+for statement in SQLITE_FTS_DDL:
+    event.listen(Product.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(Product.__table__, "before_drop", DDL("DROP TABLE IF EXISTS products_fts").execute_if(dialect="sqlite"))
+
+
+def fts5_query(search: str) -> str:
+    # Quote every word so user input can not inject FTS5 syntax, and match word prefixes.
+    words = re.findall(r"\w+", search)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search_products(query, dialect: str, search: str):
+    """
+    Restricts a product query to the products matching the search and orders them by relevance.
+    """
+    if dialect == "sqlite":
+        match = fts5_query(search)
+        if not match:
+            return query.where(false())
+        # rank is the bm25 score of FTS5, lower is more relevant.
+        ranked = text("SELECT rowid, rank FROM products_fts WHERE products_fts MATCH :match").bindparams(match=match)
+        ranked = ranked.columns(rowid=Product.id.type, rank=Product.rating.type).subquery("products_fts_rank")
+        return query.join(ranked, ranked.c.rowid == Product.id).order_by(ranked.c.rank.asc(), Product.id.asc())
+
+    # Products matching on their own document, found through the GIN index, and products of a matching
+    # category, found through the category_id index. Kept as two arms of a UNION, an OR of both would
+    # make the planner scan every product.
+    tsquery = func.websearch_to_tsquery(TS_CONFIG, search)
+    document = product_document()
+    matches = union_all(
+        select(Product.id.label("id"), literal_column("0.0", Float).label("boost"))
+        .where(document.op("@@")(tsquery)),
+        select(Product.id.label("id"), literal_column(str(CATEGORY_MATCH_BOOST), Float).label("boost"))
+        .join(Category, Category.id == Product.category_id)
+        .where(func.to_tsvector(TS_CONFIG, Category.name).op("@@")(tsquery)),
+    ).subquery("search_matches")
+    boosts = (select(matches.c.id, func.max(matches.c.boost).label("boost"))
+              .group_by(matches.c.id)
+              .subquery("search_boosts"))
+    rank = func.ts_rank(document, tsquery) + boosts.c.boost
+    return (query
+            .join(boosts, boosts.c.id == Product.id)
+            .order_by(rank.desc(), Product.id.asc()))
@@ -1,5 +1,6 @@
-from sqlalchemy import Boolean, Column, Integer, String, ForeignKey, Float, ARRAY, Enum
-from sqlalchemy.sql.expression import text
+from sqlalchemy import Boolean, Column, Integer, String, ForeignKey, Float, ARRAY, Enum, JSON, Index, LargeBinary, literal_column, type_coerce
+from sqlalchemy.sql import func
+from sqlalchemy.sql.expression import true
 from sqlalchemy.sql.sqltypes import TIMESTAMP
 from sqlalchemy.orm import relationship
 from app.db.database import Base
@@ -13,14 +14,17 @@ class User(Base):
     email = Column(String, unique=True, nullable=False)
     password = Column(String, nullable=False)
     full_name = Column(String, nullable=False)
-    is_active = Column(Boolean, server_default="True", nullable=False)
-    created_at = Column(TIMESTAMP(timezone=True), server_default=text("NOW()"), nullable=False)
+    is_active = Column(Boolean, server_default=true(), nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
 
     # New column for role
     role = Column(Enum("admin", "user", name="user_roles"), nullable=False, server_default="user")
 
     # Relationship with carts
-    carts = relationship("Cart", back_populates="user")
+    carts = relationship("Cart", back_populates="user", lazy="raise_on_sql", cascade="all, delete-orphan", passive_deletes=True)
+
+    # Serves the admin listing, filtered by role and ordered by id.
+    __table_args__ = (Index("ix_users_role_id", "role", "id"),)
 
     def __repr__(self):
         return f"<User(username={self.username}, email={self.email} , password={self.password})>"
@@ -30,29 +34,31 @@ class Cart(Base):
     __tablename__ = "carts"
 
     id = Column(Integer, primary_key=True, nullable=False, unique=True, autoincrement=True)
-    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    created_at = Column(TIMESTAMP(timezone=True), server_default=text("NOW()"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
     total_amount = Column(Float, nullable=False)
 
     # Relationship with user
-    user = relationship("User", back_populates="carts")
+    user = relationship("User", back_populates="carts", lazy="raise_on_sql")
 
     # Relationship with cart items
-    cart_items = relationship("CartItem", back_populates="cart")
+    cart_items = relationship("CartItem", back_populates="cart", lazy="raise_on_sql", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class CartItem(Base):
     __tablename__ = "cart_items"
 
     id = Column(Integer, primary_key=True, nullable=False, unique=True, autoincrement=True)
-    cart_id = Column(Integer, ForeignKey("carts.id", ondelete="CASCADE"), nullable=False)
-    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    cart_id = Column(Integer, ForeignKey("carts.id", ondelete="CASCADE"), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False, index=True)
     quantity = Column(Integer, nullable=False)
     subtotal = Column(Float, nullable=False)
+    # Set while the quantity is held out of the product stock, expired reservations are released by a sweeper.
+    reserved_until = Column(TIMESTAMP(timezone=True), nullable=True, index=True)
 
     # Relationship with cart and product
-    cart = relationship("Cart", back_populates="cart_items")
-    product = relationship("Product", back_populates="cart_items")
+    cart = relationship("Cart", back_populates="cart_items", lazy="raise_on_sql")
+    product = relationship("Product", back_populates="cart_items", lazy="raise_on_sql")
 
 
 class Category(Base):
@@ -62,7 +68,38 @@ class Category(Base):
     name = Column(String, unique=True, nullable=False)
 
     # Relationship with products
-    products = relationship("Product", back_populates="category")
+    products = relationship("Product", back_populates="category", lazy="raise_on_sql", passive_deletes=True)
+
+    # Summary of its products, kept up to date by the product service
+    facets = relationship("CategoryFacet", back_populates="category", lazy="raise_on_sql", uselist=False,
+                          cascade="all, delete-orphan", passive_deletes=True)
+
+
+class CategoryFacet(Base):
+    __tablename__ = "category_facets"
+
+    category_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True)
+    product_count = Column(Integer, nullable=False)
+    # Effective prices, after the discount; empty while the category has no products
+    min_price = Column(Float, nullable=True)
+    max_price = Column(Float, nullable=True)
+    avg_price = Column(Float, nullable=True)
+    # Sum of the effective prices, avg_price is price_sum / product_count
+    price_sum = Column(Float, server_default="0", nullable=False)
+    # The most frequent brands as [{"brand": ..., "product_count": ...}], most products first
+    top_brands = Column(JSON, nullable=False)
+    updated_at = Column(TIMESTAMP(timezone=True), nullable=False)
+
+    category = relationship("Category", back_populates="facets", lazy="raise_on_sql")
+
+
+class CategoryBrandCount(Base):
+    __tablename__ = "category_brand_counts"
+    __table_args__ = (Index("ix_category_brand_counts_top", "category_id", "product_count"),)
+
+    category_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True)
+    brand = Column(String, primary_key=True)
+    product_count = Column(Integer, nullable=False)
 
 
 class Product(Base):
@@ -77,13 +114,36 @@ class Product(Base):
     stock = Column(Integer, nullable=False)
     brand = Column(String, nullable=False)
     thumbnail = Column(String, nullable=False)
-    images = Column(ARRAY(String), nullable=False)
-    is_published = Column(Boolean, server_default="True", nullable=False)
-    created_at = Column(TIMESTAMP(timezone=True), server_default=text("NOW()"), nullable=False)
+    # Postgres array, stored as JSON on sqlite for local runs.
+    images = Column(ARRAY(String).with_variant(JSON, "sqlite"), nullable=False)
+    is_published = Column(Boolean, server_default=true(), nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False, index=True)
 
     # Relationship with category
-    category_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), nullable=False)
-    category = relationship("Category", back_populates="products")
+    category_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), nullable=False, index=True)
+    category = relationship("Category", back_populates="products", lazy="raise_on_sql")
 
     # Relationship with cart items
-    cart_items = relationship("CartItem", back_populates="product")
+    cart_items = relationship("CartItem", back_populates="product", lazy="raise_on_sql", passive_deletes=True)
+
+
+# Price after the discount. The literals stay inline and the division plain (no cast of 100 on postgres),
+# so the queries repeat the indexed expression exactly.
+EFFECTIVE_PRICE = type_coerce(
+    Product.price * (literal_column("1") - Product.discount_percentage.op("/")(literal_column("100"))), Float)
+Index("ix_products_category_effective_price", Product.category_id, EFFECTIVE_PRICE)
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    # sha256 of the route, the Authorization header and the Idempotency-Key header
+    key = Column(String(64), primary_key=True)
+    # sha256 of the request body
+    fingerprint = Column(String(64), nullable=False)
+    # The stored response, empty while the first request is running
+    status_code = Column(Integer, nullable=True)
+    headers = Column(JSON, nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    locked_until = Column(TIMESTAMP(timezone=True), nullable=False)
+    expires_at = Column(TIMESTAMP(timezone=True), nullable=False, index=True)
@@ -5,22 +5,25 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
 from app.core.security import oauth2_scheme
-from app.db.database import get_db
-from app.schemas.carts import CartsOutList, CartUpdate, CartCreate, CartOut, CartOutDelete
+from app.db.database import get_async_db
+from app.db.replicas import get_read_db
+from app.schemas.carts import CartsOutList, CartUpdate, CartCreate, CartOut, CartOutDelete, CartItemAdd, CartItemQuantity, CartLineOut
 from app.services.cart import CartService
+from app.utils.serialization import json_response
 
 router = APIRouter(tags=["Cart"], prefix="/cart")
 
 
 # Get All Carts
 @router.get("/", status_code=status.HTTP_200_OK, response_model=CartsOutList)
-def get_all_carts(
+async def get_all_carts(
         token: Annotated[str, Depends(oauth2_scheme)],
-        db: AsyncSession = Depends(get_db),
+        db: AsyncSession = Depends(get_read_db),
         page: int = Query(1, ge=1, description="Page number"),
         limit: int = Query(10, ge=1, le=100, description="Items per page"),
+        cursor: str | None = Query(None, description="Cursor returned as next_cursor by the previous page, replaces page"),
 ):
-    return CartService.get_all_carts(token, db, page, limit)
+    return json_response(CartsOutList, await CartService.get_all_carts(token, db, page, limit, cursor))
 
 
 # Get Cart By Cart ID
@@ -28,9 +31,9 @@ def get_all_carts(
 async def get_cart(
         cart_id: int,
         token: Annotated[str, Depends(oauth2_scheme)],
-        db: AsyncSession = Depends(get_db),
+        db: AsyncSession = Depends(get_read_db),
 ):
-    return await CartService.get_cart(token, db, cart_id)
+    return json_response(CartOut, await CartService.get_cart(token, db, cart_id))
 
 
 # Create New Cart
@@ -38,7 +41,7 @@ async def get_cart(
 async def create_cart(
         cart: CartCreate,
         token: Annotated[str, Depends(oauth2_scheme)],
-        db: AsyncSession = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
 ):
     return await CartService.create_cart(token, db, cart)
 
@@ -49,7 +52,7 @@ async def update_cart(
         cart_id: int,
         updated_cart: CartUpdate,
         token: Annotated[str, Depends(oauth2_scheme)],
-        db: AsyncSession = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
 ):
     return await CartService.update_cart(token, db, cart_id, updated_cart)
 
@@ -59,7 +62,40 @@ async def update_cart(
 async def delete_cart(
         cart_id: int,
         token: Annotated[str, Depends(oauth2_scheme)],
-        db: AsyncSession = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
 ):
     return await CartService.delete_cart(token, db, cart_id)
 
+
+# Add a product to the cart, or increase its quantity when already in the cart
+@router.post("/{cart_id}/items", status_code=status.HTTP_201_CREATED, response_model=CartLineOut)
+async def add_cart_item(
+        cart_id: int,
+        item: CartItemAdd,
+        token: Annotated[str, Depends(oauth2_scheme)],
+        db: AsyncSession = Depends(get_async_db),
+):
+    return await CartService.add_cart_item(token, db, cart_id, item)
+
+
+# Change the quantity of one cart line
+@router.patch("/{cart_id}/items/{item_id}", status_code=status.HTTP_200_OK, response_model=CartLineOut)
+async def update_cart_item(
+        cart_id: int,
+        item_id: int,
+        item: CartItemQuantity,
+        token: Annotated[str, Depends(oauth2_scheme)],
+        db: AsyncSession = Depends(get_async_db),
+):
+    return await CartService.update_cart_item(token, db, cart_id, item_id, item)
+
+
+# Remove one cart line
+@router.delete("/{cart_id}/items/{item_id}", status_code=status.HTTP_200_OK, response_model=CartLineOut)
+async def remove_cart_item(
+        cart_id: int,
+        item_id: int,
+        token: Annotated[str, Depends(oauth2_scheme)],
+        db: AsyncSession = Depends(get_async_db),
+):
+    return await CartService.remove_cart_item(token, db, cart_id, item_id)
@@ -1,41 +1,47 @@
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.database import get_db
-from app.schemas.categories import CategoriesOut, CategoryOut, CategoryCreate, CategoryUpdate
+from app.db.database import get_async_db
+from app.db.replicas import get_read_db
+from app.schemas.categories import CategoriesOut, CategoryOut, CategorySummaryOut, CategoryCreate, CategoryUpdate
 from app.services.categories import CategoryService
+from app.utils.etag import conditional_response
 
 router = APIRouter(tags=["categories"], prefix="/categories")
 
 
 @router.get("/", response_model=CategoriesOut)
-def get_all_categories(
-        db: Session = Depends(get_db),
+async def get_all_categories(
+        request: Request,
+        db: AsyncSession = Depends(get_read_db),
         page: int = Query(1, ge=1, description="Page Number"),
         limit: int = Query(10, ge=1, description="Items per page"),
         search: str | None = Query("", description="Search based on the name of categories"),
+        cursor: str | None = Query(None, description="Cursor returned as next_cursor by the previous page, replaces page"),
 ):
-    return CategoryService.get_all_categories(db, page, limit, search)
+    categories = await CategoryService.get_all_categories(db, page, limit, search, cursor)
+    return conditional_response(request, CategoriesOut, categories)
 
 
-@router.get("/{category_id}", response_model=CategoryOut)
-def get_category_by_id(category_id: int, db: Session = Depends(get_db)):
-    return CategoryService.get_category(db, category_id)
+@router.get("/{category_id}", response_model=CategorySummaryOut)
+async def get_category_by_id(category_id: int, request: Request, db: AsyncSession = Depends(get_read_db)):
+    category = await CategoryService.get_category(db, category_id)
+    return conditional_response(request, CategorySummaryOut, category)
 
 
 @router.post("/", response_model=CategoryOut)
-def create_category(category: CategoryCreate, db: Session = Depends(get_db)):
-    return CategoryService.create_category(db, category)
+async def create_category(category: CategoryCreate, db: AsyncSession = Depends(get_async_db)):
+    return await CategoryService.create_category(db, category)
 
 
 @router.put("/{category_id}", response_model=CategoryOut)
-def update_category(category_update: CategoryUpdate,  category_id: int, db: Session = Depends(get_db)):
-    return CategoryService.update_category(db, category_id, category_update)
+async def update_category(category_update: CategoryUpdate,  category_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await CategoryService.update_category(db, category_id, category_update)
 
 
 @router.delete("/{category_id}", response_model=CategoryOut)
-def delete_category(category_id: int, db: Session = Depends(get_db)):
-    return CategoryService.delete_category(db, category_id)
+async def delete_category(category_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await CategoryService.delete_category(db, category_id)
 
 
 
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends
+from starlette import status
+
+from app.core.security import check_admin_role
+from app.schemas.internal import PoolStatsOut, ReplicaStatsOut, CacheStatsOut, PasswordHashStatsOut
+from app.services.internal import InternalService
+
+router = APIRouter(tags=["internal"], prefix="/internal", dependencies=[Depends(check_admin_role)])
+
+
+# Connection pool usage of every database engine, admin only.
+@router.get("/pool", response_model=PoolStatsOut, status_code=status.HTTP_200_OK)
+async def get_pool_stats():
+    return await InternalService.get_pool_stats()
+
+
+# Health and lag of every read replica, admin only.
+@router.get("/replicas", response_model=ReplicaStatsOut, status_code=status.HTTP_200_OK)
+async def get_replica_stats():
+    return await InternalService.get_replica_stats()
+
+
+# Hit, miss and eviction counters of the in-process caches, admin only.
+@router.get("/cache", response_model=CacheStatsOut, status_code=status.HTTP_200_OK)
+async def get_cache_stats():
+    return await InternalService.get_cache_stats()
+
+
+# Queue depth and latency of the password hashing pool, admin only.
+@router.get("/password-hashing", response_model=PasswordHashStatsOut, status_code=status.HTTP_200_OK)
+async def get_password_hash_stats():
+    return await InternalService.get_password_hash_stats()
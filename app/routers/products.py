@@ -1,58 +1,98 @@
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
+from typing import Literal
 
-from app.db.database import get_db
-from app.schemas.product import ProductsOut, ProductOut, ProductCreate, ProductUpdate
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.security import check_admin_role
+from app.db.database import get_async_db
+from app.db.replicas import get_read_db
+from app.schemas.product import ProductsOut, ProductOut, ProductCreate, ProductUpdate, ProductImportOut, ProductStockAdjust
+from app.services.product_export import ProductExportService
+from app.services.product_import import ProductImportService
 from app.services.products import ProductService
+from app.services.stock import StockService
+from app.utils.etag import conditional_response
 
 router = APIRouter(tags=["products"], prefix="/products")
 
 
 # Get all products
 @router.get('/', response_model=ProductsOut)
-def get_all_products(
-        db: Session = Depends(get_db),
+async def get_all_products(
+        request: Request,
+        db: AsyncSession = Depends(get_read_db),
         page: int = Query(1, ge=1, description="Page number"),
         limit: int = Query(5, ge=1, description="Products per page"),
-        search: str | None = Query("", description="Search based on the title of the product"),
+        search: str | None = Query("", description="Full-text search on title, brand, description and category, ranked by relevance"),
+        cursor: str | None = Query(None, description="Cursor returned as next_cursor by the previous page, replaces page"),
+):
+    products = await ProductService.get_all_products(db, page, limit, search, cursor)
+    return conditional_response(request, ProductsOut, products)
+
+
+# Stream the whole catalog as NDJSON or CSV, admin only.
+@router.get('/export', dependencies=[Depends(check_admin_role)])
+async def export_products(
+        file_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format", description="Export format"),
 ):
-    return ProductService.get_all_products(db, page, limit, search)
+    return ProductExportService.export_products(file_format)
 
 
 # Get a single product.
 @router.get('/{product_id}', response_model=ProductOut)
-def get_single_product(
+async def get_single_product(
         product_id: int,
-        db: Session = Depends(get_db),
+        request: Request,
+        db: AsyncSession = Depends(get_read_db),
 ):
-    return ProductService.get_product_by_id(db, product_id)
+    product = await ProductService.get_product_by_id(db, product_id)
+    return conditional_response(request, ProductOut, product)
 
 
 # Create a product
 @router.post('/', response_model=ProductOut)
-def create_product(
+async def create_product(
         product: ProductCreate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
 ):
-    return ProductService.create_product(db, product)
+    return await ProductService.create_product(db, product)
+
+
+# Bulk import products from a streamed NDJSON (default) or CSV (Content-Type: text/csv) body, admin only.
+@router.post('/import', response_model=ProductImportOut, dependencies=[Depends(check_admin_role)])
+async def import_products(
+        request: Request,
+        db: AsyncSession = Depends(get_async_db),
+):
+    return await ProductImportService.import_products(db, request)
 
 
 # update the properties of a product.
 @router.put('/{product_id}', response_model=ProductOut)
-def update_product(
+async def update_product(
         product_id: int,
         product: ProductUpdate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
+):
+    return await ProductService.update_product(db, product_id, product)
+
+
+# Receive or write off stock of a product, admin only. PUT leaves the stock alone, reservations change it meanwhile.
+@router.post('/{product_id}/stock', response_model=ProductOut, dependencies=[Depends(check_admin_role)])
+async def adjust_product_stock(
+        product_id: int,
+        adjustment: ProductStockAdjust,
+        db: AsyncSession = Depends(get_async_db),
 ):
-    return ProductService.update_product(db, product_id, product)
+    return await StockService.adjust_stock(db, product_id, adjustment.delta)
 
 
 # Delete a product
 @router.delete('/{product_id}', response_model=ProductOut)
-def delete_product(
+async def delete_product(
         product_id: int,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
 ):
-    return ProductService.delete_product(db, product_id)
+    return await ProductService.delete_product(db, product_id)
 
 
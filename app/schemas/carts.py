@@ -62,6 +62,7 @@ class CartOut(BaseModel):
 class CartsOutList(BaseModel):
     message: str
     data: List[CartBase]
+    next_cursor: str | None = None
 
 
 # The cart corresponding to the logged-in user.
@@ -82,7 +83,7 @@ class CartOutDelete(BaseModel):
 # Create Cart
 class CartItemCreate(BaseModel):
     product_id: int
-    quantity: int
+    quantity: int = Field(gt=0)
 
 
 class CartCreate(BaseModel):
@@ -95,3 +96,31 @@ class CartCreate(BaseModel):
 # Update Cart
 class CartUpdate(CartCreate):
     pass
+
+
+# Line-level cart changes, answered with the changed line and the new cart total.
+class CartItemAdd(BaseModel):
+    product_id: int
+    quantity: int = Field(gt=0)
+
+
+class CartItemQuantity(BaseModel):
+    quantity: int = Field(gt=0)
+
+
+class CartLineItem(BaseModel):
+    id: int
+    product_id: int
+    quantity: int
+    subtotal: float
+
+
+class CartLine(BaseModel):
+    cart_id: int
+    total_amount: float
+    cart_item: CartLineItem
+
+
+class CartLineOut(BaseModel):
+    message: str
+    data: CartLine
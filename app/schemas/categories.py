@@ -1,5 +1,5 @@
 from typing import List
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 
 
 class CategoryBase(BaseModel):
@@ -7,6 +7,29 @@ class CategoryBase(BaseModel):
     name: str
 
 
+class BrandCount(BaseModel):
+    brand: str
+    product_count: int
+
+
+class CategoryFacets(BaseModel):
+    product_count: int = 0
+    # Effective prices, after the discount
+    min_price: float | None = None
+    max_price: float | None = None
+    avg_price: float | None = None
+    top_brands: List[BrandCount] = []
+
+
+class CategorySummary(CategoryBase):
+    facets: CategoryFacets = Field(default_factory=CategoryFacets)
+
+    # Categories without a product have no facets row yet.
+    @field_validator("facets", mode="before")
+    def default_facets(cls, v):
+        return CategoryFacets() if v is None else v
+
+
 class CategoryCreate(BaseModel):
     name: str
 
@@ -20,9 +43,15 @@ class CategoryOut(BaseModel):
     data: CategoryBase
 
 
+class CategorySummaryOut(BaseModel):
+    message: str
+    data: CategorySummary
+
+
 class CategoriesOut(BaseModel):
     message: str
-    data: List[CategoryBase]
+    data: List[CategorySummary]
+    next_cursor: str | None = None
 
 
 class CategoryDelete(BaseModel):
@@ -0,0 +1,69 @@
+from datetime import datetime
+from typing import List
+
+from pydantic import BaseModel
+
+
+class PoolStats(BaseModel):
+    engine: str
+    pool_class: str
+    size: int | None
+    checked_in: int | None
+    checked_out: int | None
+    overflow: int | None
+    checkouts: int | None
+    timeouts: int | None
+    avg_wait_ms: float | None
+    max_wait_ms: float | None
+
+
+class PoolStatsOut(BaseModel):
+    message: str
+    data: List[PoolStats]
+
+
+class ReplicaStats(BaseModel):
+    replica: str
+    healthy: bool
+    lag_seconds: float | None
+    error: str | None
+    checked_at: datetime | None
+
+
+class ReplicaStatsOut(BaseModel):
+    message: str
+    data: List[ReplicaStats]
+
+
+class CacheStats(BaseModel):
+    cache: str
+    entries: int
+    max_entries: int
+    ttl_seconds: float
+    hits: int
+    misses: int
+    hit_ratio: float
+    evictions: int
+    expirations: int
+    invalidations: int
+
+
+class CacheStatsOut(BaseModel):
+    message: str
+    data: List[CacheStats]
+
+
+class PasswordHashStats(BaseModel):
+    workers: int
+    max_queue: int
+    in_flight: int
+    queue_depth: int
+    completed: int
+    rejected: int
+    avg_latency_ms: float
+    max_latency_ms: float
+
+
+class PasswordHashStatsOut(BaseModel):
+    message: str
+    data: PasswordHashStats
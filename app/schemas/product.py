@@ -15,12 +15,6 @@ class ProductBase(BaseModel):
     title: str
     description: str
     price: int
-
-    @field_validator("discount_percentage")
-    def validate_discount_percentage(cls, v):
-        if v < 0 or v > 100:
-            raise ValueError("Discount percentage must be between 0 and 100")
-        return v
     discount_percentage: float
     rating: float
     stock: int
@@ -40,12 +34,25 @@ class ProductCreate(ProductBase):
     id: ClassVar[int]
     category: ClassVar[CategoryBase]
 
+    # Only incoming products are checked, stored ones were validated when they were written.
+    @field_validator("discount_percentage")
+    def validate_discount_percentage(cls, v):
+        if v < 0 or v > 100:
+            raise ValueError("Discount percentage must be between 0 and 100")
+        return v
+
     class Config(BaseConfig):
         pass
 
 
 class ProductUpdate(ProductCreate):
-    pass
+    # Stock is the quantity left after the cart reservations, it only changes through ProductStockAdjust.
+    stock: ClassVar[int]
+
+
+class ProductStockAdjust(BaseModel):
+    # Units received (positive) or written off (negative)
+    delta: int
 
 
 class ProductOut(BaseModel):
@@ -59,11 +66,28 @@ class ProductOut(BaseModel):
 class ProductsOut(BaseModel):
     message: str
     data: List[ProductBase]
+    next_cursor: str | None = None
 
     class config(BaseConfig):
         pass
 
 
+class ProductImportError(BaseModel):
+    row: int
+    errors: List[str]
+
+
+class ProductImportReport(BaseModel):
+    imported: int
+    failed: int
+    errors: List[ProductImportError]
+
+
+class ProductImportOut(BaseModel):
+    message: str
+    data: ProductImportReport
+
+
 class ProductDelete(ProductBase):
     category: ClassVar[CategoryBase]
 
@@ -44,6 +44,7 @@ class UserOut(BaseModel):
 class UsersOut(BaseModel):
     message: str
     data: List[UserBase]
+    next_cursor: str | None = None
 
     class Config(BaseConfig):
         pass
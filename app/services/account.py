@@ -1,48 +1,65 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
-from app.core.security import get_username_from_token, verify_password
+from app.core.security import get_principal_from_token, invalidate_principal
 from app.models.models import User
 from app.schemas.accounts import AccountUpdate
+from app.services.cart import CartService
+from app.services.stock import StockService
 from app.utils.responses import ResponseHandler
 
 
 class AccountService:
     @staticmethod
-    async def get_my_info(db: Session, token):
-        # Get the username from returned payload
-        active_user_username = await get_username_from_token(token)
+    async def get_user_with_carts(db: AsyncSession, user_id: int) -> User | None:
+        """
+        Utility to fetch the user together with the carts the account profile is serialized with.
+        """
+        result = await db.execute(
+            select(User)
+            .options(selectinload(User.carts).options(*CartService.cart_loader_options()))
+            .filter(User.id == user_id)
+        )
+        return result.scalars().first()
 
-        # Validate if the username is within in the database
-        db_user = db.query(User).filter(User.username == active_user_username).first()
+    @staticmethod
+    async def get_my_info(db: AsyncSession, token):
+        # Get the active user from the token
+        principal = await get_principal_from_token(token, db)
+
+        # Validate if the user is within in the database
+        db_user = await AccountService.get_user_with_carts(db, principal.id)
         if not db_user:
-            return ResponseHandler.not_found_error("User", active_user_username)
+            return ResponseHandler.not_found_error("User", principal.username)
 
         # Return the profile of logged-in user
         return ResponseHandler.get_single_success(db_user.username, db_user.id, db_user)
 
     @staticmethod
-    async def edit_my_info(db: Session, token, updated_user: AccountUpdate):
-        active_user_username = await get_username_from_token(token)
-        db_user = db.query(User).filter(User.username == active_user_username).first()
+    async def edit_my_info(db: AsyncSession, token, updated_user: AccountUpdate):
+        principal = await get_principal_from_token(token, db)
+        db_user = await AccountService.get_user_with_carts(db, principal.id)
         if not db_user:
-            return ResponseHandler.not_found_error("User", active_user_username)
+            return ResponseHandler.not_found_error("User", principal.username)
 
         # update the user with the information from fronted/api.
         for key, value in updated_user.model_dump().items():
             setattr(db_user, key, value)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await invalidate_principal(db_user.id)
         return ResponseHandler.update_success(db_user.username, db_user.id, db_user)
 
     @staticmethod
-    async def remove_my_account(db: Session, token):
-        active_user_username = await get_username_from_token(token)
-        db_user = db.query(User).filter(User.username == active_user_username).first()
+    async def remove_my_account(db: AsyncSession, token):
+        principal = await get_principal_from_token(token, db)
+        db_user = await AccountService.get_user_with_carts(db, principal.id)
         if not db_user:
-            return ResponseHandler.not_found_error("User", active_user_username)
-        db.delete(db_user)
-        db.commit()
+            return ResponseHandler.not_found_error("User", principal.username)
+        # Carts go with the user, give the stock they reserved back first
+        await StockService.release_user(db, db_user.id)
+        await db.delete(db_user)
+        await db.commit()
+        await StockService.invalidate_cache(db)
+        await invalidate_principal(db_user.id)
         return ResponseHandler.delete_success(db_user.username, db_user.id, db_user)
-
-
-
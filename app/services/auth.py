@@ -1,10 +1,12 @@
 from fastapi import Depends
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 from app.core.config import settings
-from app.core.security import hash_password, verify_password, create_access_token
-from app.db.database import get_db
+from app.core.hashing import hash_password_async, verify_and_update_password_async
+from app.core.security import create_access_token
+from app.db.database import get_async_db
 from app.schemas.auth import Signup, TokenResponse
 from app.models.models import User
 from app.utils.responses import ResponseHandler
@@ -12,38 +14,40 @@ from app.utils.responses import ResponseHandler
 
 class AuthService:
     @staticmethod
-    async def signup(user: Signup, db: Session):
+    async def signup(user: Signup, db: AsyncSession):
         # Hash the password of the user.
-        user.password = hash_password(user.password)
+        user.password = await hash_password_async(user.password)
 
         # Generate the object of the user.
         db_user = User(**user.model_dump())
 
         # The add the user to the database.
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
 
         return ResponseHandler.create_success(db_user.username, db_user.id, db_user)
 
     @staticmethod
-    async def login(user_credentials: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    async def login(user_credentials: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
         # First get the user having the username in the submitted credentials
-        user = db.query(User).filter(User.username == user_credentials.username).first()
+        result = await db.execute(select(User).filter(User.username == user_credentials.username))
+        user = result.scalars().first()
 
         # If the user is null
         if not user:
             raise ResponseHandler.auth_bad_request_error()
 
         # Verification of the user's password.
-        if not verify_password(user_credentials.password, user.password):
+        valid, new_hash = await verify_and_update_password_async(user_credentials.password, user.password)
+        if not valid:
             raise ResponseHandler.auth_bad_request_error()
 
+        # The stored hash uses outdated cost parameters, replace it while the plain password is known.
+        if new_hash:
+            user.password = new_hash
+            await db.commit()
+
         # Return the token.
-        access_token = await create_access_token(data={"sub": user.username}, expire_delta=timedelta(minutes=settings.access_token_expire_minutes))
+        access_token = await create_access_token(data={"sub": user.username, "uid": user.id}, expire_delta=timedelta(minutes=settings.access_token_expire_minutes))
         return TokenResponse(access_token=access_token, expires_in=settings.access_token_expire_minutes)
-
-
-
-
-
@@ -1,25 +1,136 @@
+from collections import Counter
+
+from sqlalchemy import Numeric, cast, func, select, delete, insert, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from sqlalchemy.orm import joinedload
-from app.core.security import get_username_from_token
-from app.models.models import User, Cart, CartItem, Product
-from app.schemas.carts import CartCreate, CartUpdate
+from sqlalchemy.orm import joinedload, selectinload
+from app.core.security import Principal, get_principal_from_token
+from app.models.models import Cart, CartItem, Product
+from app.schemas.carts import CartCreate, CartUpdate, CartItemAdd, CartItemQuantity
+from app.services.stock import StockService
+from app.utils.pagination import paginate, page_items
 from app.utils.responses import ResponseHandler
 from sqlalchemy.exc import SQLAlchemyError
 
 
 class CartService:
     @staticmethod
-    async def get_user_by_token(token: str, db: AsyncSession) -> User:
+    async def get_user_by_token(token: str, db: AsyncSession) -> Principal:
+        """
+        Utility to fetch the active user from the token, usually without querying the users table.
+        """
+        return await get_principal_from_token(token, db)
+
+    @staticmethod
+    def cart_loader_options():
+        """
+        Utility returning the loader options matching CartBase: the items of every cart are loaded
+        in one extra query, with their product and its category joined in that same query.
         """
-        Utility to fetch the active user from the token.
+        return (
+            selectinload(Cart.cart_items)
+            .joinedload(CartItem.product, innerjoin=True)
+            .joinedload(Product.category, innerjoin=True),
+        )
+
+    @staticmethod
+    async def get_user_cart(db: AsyncSession, user_id: int, cart_id: int) -> Cart | None:
+        result = await db.execute(
+            select(Cart)
+            .options(*CartService.cart_loader_options())
+            .filter(Cart.id == cart_id, Cart.user_id == user_id)
+        )
+        return result.scalars().first()
+
+    @staticmethod
+    def line_subtotal(product, quantity: int) -> float:
+        # Rounded to cents, the cart total is kept as their exact sum.
+        return round(product.price * quantity * (1 - (product.discount_percentage / 100)), 2)
+
+    @staticmethod
+    async def lock_cart_line(db: AsyncSession, user_id: int, cart_id: int, item_id: int):
         """
-        username = await get_username_from_token(token)
-        result = await db.execute(select(User).filter(User.username == username))
-        user = result.scalars().first()
-        if not user:
-            raise ValueError(f"User with username '{username}' not found.")
-        return user
+        Utility fetching a line of the user's cart with the price of its product, in one query.
+        The cart and line rows are locked until commit so concurrent changes to the same cart apply one after
+        the other, and the expiry sweeper leaves the reservation of its lines alone. Locking the line too makes
+        Postgres read it again after a lock wait, rather than return the quantity it had before.
+        """
+        result = await db.execute(
+            select(CartItem.id, CartItem.product_id, CartItem.quantity, CartItem.subtotal, CartItem.reserved_until,
+                   Product.price, Product.discount_percentage)
+            .join(Cart, Cart.id == CartItem.cart_id)
+            .join(Product, Product.id == CartItem.product_id)
+            .filter(CartItem.id == item_id, CartItem.cart_id == cart_id, Cart.user_id == user_id)
+            .with_for_update(of=(Cart, CartItem))
+        )
+        line = result.first()
+        if not line:
+            ResponseHandler.not_found_error("Cart item", item_id)
+        return line
+
+    @staticmethod
+    def reserved_quantity(line) -> int:
+        return line.quantity if line.reserved_until is not None else 0
+
+    @staticmethod
+    def cart_quantities(cart_items) -> Counter:
+        quantities = Counter()
+        for item in cart_items:
+            quantities[item["product_id"]] += item["quantity"]
+        return quantities
+
+    @staticmethod
+    async def adjust_cart_total(db: AsyncSession, cart_id: int, delta: float) -> float:
+        """
+        Utility applying the change of one line to the cart total with a single relative UPDATE. Subtotals are
+        whole cents and the total is rounded back to cents on every change, so float error never accumulates.
+        """
+        result = await db.execute(
+            update(Cart)
+            .where(Cart.id == cart_id)
+            .values(total_amount=func.round(cast(Cart.total_amount + delta, Numeric), 2))
+            .returning(Cart.total_amount)
+        )
+        return result.scalar_one()
+
+    @staticmethod
+    def cart_line(cart_id: int, total_amount: float, item_id: int, product_id: int, quantity: int, subtotal: float):
+        return {
+            "cart_id": cart_id,
+            "total_amount": total_amount,
+            "cart_item": {"id": item_id, "product_id": product_id, "quantity": quantity, "subtotal": subtotal},
+        }
+
+    @staticmethod
+    async def price_cart_items(db: AsyncSession, cart_items) -> tuple[list[dict], float]:
+        """
+        Utility resolving every product of the cart lines in a single query and computing their subtotals.
+        Every unknown product id is reported together.
+        """
+        product_ids = {item.product_id for item in cart_items}
+        result = await db.execute(
+            select(Product.id, Product.price, Product.discount_percentage).filter(Product.id.in_(product_ids))
+        )
+        products = {product.id: product for product in result}
+
+        missing_ids = sorted(product_ids - products.keys())
+        if missing_ids:
+            ResponseHandler.not_found_error("Products", ", ".join(map(str, missing_ids)))
+
+        rows = []
+        total_amount = 0
+        reserved_until = StockService.reservation_expiry()
+        for item in cart_items:
+            product = products[item.product_id]
+            # Calculate subtotal
+            subtotal = CartService.line_subtotal(product, item.quantity)
+            total_amount += subtotal
+            rows.append({
+                "product_id": item.product_id,
+                "quantity": item.quantity,
+                "subtotal": subtotal,
+                "reserved_until": reserved_until,
+            })
+        return rows, round(total_amount, 2)
 
     @staticmethod
     async def get_all_carts(
@@ -27,21 +138,23 @@ class CartService:
             db: AsyncSession,
             page: int = 1,
             limit: int = 10,
+            cursor: str | None = None,
     ):
         try:
             user = await CartService.get_user_by_token(token, db)
 
             # Fetch paginated carts for the user
-            result = await db.execute(
+            keyset = (Cart.id,)
+            query = (
                 select(Cart)
+                .options(*CartService.cart_loader_options())
                 .filter(Cart.user_id == user.id)
-                .offset((page - 1) * limit)
-                .limit(limit)
             )
-            carts = result.scalars().all()
+            result = await db.execute(paginate(query, keyset, page, limit, cursor))
+            carts, next_cursor = page_items(result.scalars().all(), keyset, limit)
 
             message = f"Retrieved {len(carts)} carts for page {page} with limit {limit}."
-            return ResponseHandler.success(message, carts)
+            return {**ResponseHandler.success(message, carts), "next_cursor": next_cursor}
         except SQLAlchemyError as e:
             return ResponseHandler.server_error(f"Database error: {str(e)}")
 
@@ -49,32 +162,19 @@ class CartService:
     async def create_cart(token: str, db: AsyncSession, cart: CartCreate):
         try:
             user = await CartService.get_user_by_token(token, db)
-            cart_dict = cart.model_dump()
-            cart_items_data = cart_dict.pop("cart_items", [])
-
-            cart_items = []
-            total_amount = 0
-            for item_data in cart_items_data:
-                product_id = item_data["product_id"]
-                quantity = item_data["quantity"]
-
-                # Validate product existence
-                result = await db.execute(select(Product).filter(Product.id == product_id))
-                product = result.scalars().first()
-                if not product:
-                    return ResponseHandler.not_found_error("Product", product_id)
-
-                # Calculate subtotal
-                subtotal = product.price * quantity * (1 - (product.discount_percentage / 100))
-                total_amount += subtotal
-
-                cart_items.append(CartItem(product_id=product_id, quantity=quantity, subtotal=subtotal))
+            cart_dict = cart.model_dump(exclude={"cart_items"})
+            cart_items, total_amount = await CartService.price_cart_items(db, cart.cart_items)
+            await StockService.reserve(db, CartService.cart_quantities(cart_items))
 
-            # Create cart
-            cart_db = Cart(cart_items=cart_items, user_id=user.id, total_amount=total_amount, **cart_dict)
+            # Create cart, then its items in one multi-row insert
+            cart_db = Cart(user_id=user.id, total_amount=total_amount, **cart_dict)
             db.add(cart_db)
+            await db.flush()
+            if cart_items:
+                await db.execute(insert(CartItem), [{**item, "cart_id": cart_db.id} for item in cart_items])
             await db.commit()
-            await db.refresh(cart_db)
+            await StockService.invalidate_cache(db)
+            cart_db = await CartService.get_user_cart(db, user.id, cart_db.id)
 
             return ResponseHandler.create_success("cart", cart_db.id, cart_db)
         except SQLAlchemyError as e:
@@ -87,10 +187,7 @@ class CartService:
             user = await CartService.get_user_by_token(token, db)
 
             # Fetch cart
-            result = await db.execute(
-                select(Cart).filter(Cart.id == cart_id, Cart.user_id == user.id)
-            )
-            cart = result.scalars().first()
+            cart = await CartService.get_user_cart(db, user.id, cart_id)
             if not cart:
                 return ResponseHandler.not_found_error("Cart", cart_id)
 
@@ -104,39 +201,29 @@ class CartService:
             user = await CartService.get_user_by_token(token, db)
 
             # Fetch the cart to update
-            result = await db.execute(
-                select(Cart).filter(Cart.id == cart_id, Cart.user_id == user.id)
-            )
-            db_cart = result.scalars().first()
+            db_cart = await CartService.get_user_cart(db, user.id, cart_id)
             if not db_cart:
                 return ResponseHandler.not_found_error("Cart", cart_id)
 
+            # Validate and price the new items before touching the existing ones
+            cart_items, total_amount = await CartService.price_cart_items(db, cart.cart_items)
+            # Reserve or release only the difference between the old and the new quantities
+            await StockService.replace_cart(db, db_cart.id, CartService.cart_quantities(cart_items))
+
             # Clear existing cart items
             await db.execute(
-                select(CartItem).filter(CartItem.cart_id == db_cart.id).delete()
+                delete(CartItem).where(CartItem.cart_id == db_cart.id)
             )
 
-            # Add updated items
-            total_amount = 0
-            for item in cart.cart_items:
-                product_id = item.product_id
-                quantity = item.quantity
-
-                # Validate product existence
-                result = await db.execute(select(Product).filter(Product.id == product_id))
-                product = result.scalars().first()
-                if not product:
-                    return ResponseHandler.not_found_error("Product", product_id)
-
-                # Calculate subtotal
-                subtotal = product.price * quantity * (1 - (product.discount_percentage / 100))
-                total_amount += subtotal
-
-                db.add(CartItem(cart_id=db_cart.id, product_id=product_id, quantity=quantity, subtotal=subtotal))
+            # Add updated items in one multi-row insert
+            if cart_items:
+                await db.execute(insert(CartItem), [{**item, "cart_id": db_cart.id} for item in cart_items])
 
             db_cart.total_amount = total_amount
             await db.commit()
-            await db.refresh(db_cart)
+            await StockService.invalidate_cache(db)
+            db.expire(db_cart)
+            db_cart = await CartService.get_user_cart(db, user.id, cart_id)
 
             return ResponseHandler.update_success("cart", db_cart.id, db_cart)
         except SQLAlchemyError as e:
@@ -149,22 +236,120 @@ class CartService:
             user = await CartService.get_user_by_token(token, db)
 
             # Fetch cart with related cart items
-            result = await db.execute(
-                select(Cart)
-                .options(joinedload(Cart.cart_items))
-                .filter(Cart.id == cart_id, Cart.user_id == user.id)
-            )
-            db_cart = result.scalars().first()
+            db_cart = await CartService.get_user_cart(db, user.id, cart_id)
             if not db_cart:
                 return ResponseHandler.not_found_error("Cart", cart_id)
 
-            # Delete cart and its items
+            # Give the reserved stock back, then delete cart and its items
+            await StockService.release_cart(db, db_cart.id)
             for cart_item in db_cart.cart_items:
                 await db.delete(cart_item)
             await db.delete(db_cart)
             await db.commit()
+            await StockService.invalidate_cache(db)
 
             return ResponseHandler.delete_success("cart", cart_id, db_cart)
         except SQLAlchemyError as e:
             await db.rollback()
             return ResponseHandler.server_error(f"Database error: {str(e)}")
+
+    @staticmethod
+    async def add_cart_item(token: str, db: AsyncSession, cart_id: int, item: CartItemAdd):
+        try:
+            user = await CartService.get_user_by_token(token, db)
+
+            # Lock the cart, then read the line already holding this product, if any. The line is read once
+            # the lock is held so it reflects the changes of a request that held the lock before.
+            result = await db.execute(
+                select(Cart.id).filter(Cart.id == cart_id, Cart.user_id == user.id).with_for_update()
+            )
+            if result.scalar_one_or_none() is None:
+                return ResponseHandler.not_found_error("Cart", cart_id)
+            result = await db.execute(
+                select(CartItem.id, CartItem.quantity, CartItem.subtotal, CartItem.reserved_until)
+                .filter(CartItem.cart_id == cart_id, CartItem.product_id == item.product_id)
+                .with_for_update()
+            )
+            line = result.first()
+
+            result = await db.execute(
+                select(Product.price, Product.discount_percentage).filter(Product.id == item.product_id)
+            )
+            product = result.first()
+            if not product:
+                return ResponseHandler.not_found_error("Product", item.product_id)
+
+            # Adding a product already in the cart increases the quantity of its line.
+            reserved_until = StockService.reservation_expiry()
+            if line is not None:
+                quantity = line.quantity + item.quantity
+                await StockService.reserve(db, {item.product_id: quantity - CartService.reserved_quantity(line)})
+                subtotal = CartService.line_subtotal(product, quantity)
+                await db.execute(
+                    update(CartItem)
+                    .where(CartItem.id == line.id)
+                    .values(quantity=quantity, subtotal=subtotal, reserved_until=reserved_until)
+                )
+                item_id, delta = line.id, subtotal - line.subtotal
+            else:
+                quantity = item.quantity
+                await StockService.reserve(db, {item.product_id: quantity})
+                subtotal = CartService.line_subtotal(product, quantity)
+                result = await db.execute(
+                    insert(CartItem)
+                    .values(cart_id=cart_id, product_id=item.product_id, quantity=quantity, subtotal=subtotal,
+                            reserved_until=reserved_until)
+                    .returning(CartItem.id)
+                )
+                item_id, delta = result.scalar_one(), subtotal
+
+            total_amount = await CartService.adjust_cart_total(db, cart_id, delta)
+            await db.commit()
+            await StockService.invalidate_cache(db)
+
+            data = CartService.cart_line(cart_id, total_amount, item_id, item.product_id, quantity, subtotal)
+            return ResponseHandler.create_success("cart item", item_id, data)
+        except SQLAlchemyError as e:
+            await db.rollback()
+            return ResponseHandler.server_error(f"Database error: {str(e)}")
+
+    @staticmethod
+    async def update_cart_item(token: str, db: AsyncSession, cart_id: int, item_id: int, item: CartItemQuantity):
+        try:
+            user = await CartService.get_user_by_token(token, db)
+            line = await CartService.lock_cart_line(db, user.id, cart_id, item_id)
+            await StockService.reserve(db, {line.product_id: item.quantity - CartService.reserved_quantity(line)})
+
+            subtotal = CartService.line_subtotal(line, item.quantity)
+            await db.execute(
+                update(CartItem)
+                .where(CartItem.id == item_id)
+                .values(quantity=item.quantity, subtotal=subtotal, reserved_until=StockService.reservation_expiry())
+            )
+            total_amount = await CartService.adjust_cart_total(db, cart_id, subtotal - line.subtotal)
+            await db.commit()
+            await StockService.invalidate_cache(db)
+
+            data = CartService.cart_line(cart_id, total_amount, item_id, line.product_id, item.quantity, subtotal)
+            return ResponseHandler.update_success("cart item", item_id, data)
+        except SQLAlchemyError as e:
+            await db.rollback()
+            return ResponseHandler.server_error(f"Database error: {str(e)}")
+
+    @staticmethod
+    async def remove_cart_item(token: str, db: AsyncSession, cart_id: int, item_id: int):
+        try:
+            user = await CartService.get_user_by_token(token, db)
+            line = await CartService.lock_cart_line(db, user.id, cart_id, item_id)
+            await StockService.release(db, {line.product_id: CartService.reserved_quantity(line)})
+
+            await db.execute(delete(CartItem).where(CartItem.id == item_id))
+            total_amount = await CartService.adjust_cart_total(db, cart_id, -line.subtotal)
+            await db.commit()
+            await StockService.invalidate_cache(db)
+
+            data = CartService.cart_line(cart_id, total_amount, item_id, line.product_id, line.quantity, line.subtotal)
+            return ResponseHandler.delete_success("cart item", item_id, data)
+        except SQLAlchemyError as e:
+            await db.rollback()
+            return ResponseHandler.server_error(f"Database error: {str(e)}")
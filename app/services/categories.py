@@ -1,48 +1,97 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from app.core.cache import category_cache, product_cache
+from app.core.invalidation import invalidation_bus
+from app.db.replicas import can_cache_reads
 from app.models.models import Category
-from app.schemas.categories import CategoryUpdate, CategoryCreate
+from app.schemas.categories import CategoriesOut, CategorySummaryOut, CategoryUpdate, CategoryCreate
+from app.utils.pagination import paginate, page_items
 from app.utils.responses import ResponseHandler
+from app.utils.serialization import RenderedJSON, render_json
 
 
 class CategoryService:
     @staticmethod
-    def get_all_categories(db: Session, page: int, limit: int, search: str = ""):
-        categories = db.query(Category).order_by(Category.name.asc()).filter(Category.name.contains(search)).limit(limit).offset((page - 1) * limit).all()
-        return {"message": f"Page {page} with {limit} categories", "data": categories}
+    async def get_all_categories(db: AsyncSession, page: int, limit: int, search: str = "", cursor: str | None = None):
+        cache_key = ("list", page, limit, search, cursor)
+        response = category_cache.get(cache_key)
+        if response is not None:
+            return response
+
+        keyset = (Category.name,)
+        query = select(Category).options(joinedload(Category.facets)).filter(Category.name.contains(search))
+        result = await db.execute(paginate(query, keyset, page, limit, cursor))
+        categories, next_cursor = page_items(result.scalars().all(), keyset, limit)
+        # Cached rendered, hits are sent without validating or serializing again.
+        response = RenderedJSON(render_json(CategoriesOut, {
+            "message": f"Page {page} with {limit} categories", "data": categories, "next_cursor": next_cursor}))
+        if can_cache_reads(db, category_cache):
+            category_cache.set(cache_key, response)
+        return response
 
     @staticmethod
-    def get_category(db: Session, category_id: int):
-        category = db.query(Category).filter(Category.id == category_id).first()
+    async def get_category(db: AsyncSession, category_id: int):
+        response = category_cache.get(("detail", category_id))
+        if response is not None:
+            return response
+
+        category = await db.get(Category, category_id, options=[joinedload(Category.facets)])
         if not category:
             ResponseHandler.not_found_error("Category", category_id)
-        return ResponseHandler.get_single_success(category.name, category_id, category)
+        response = RenderedJSON(render_json(
+            CategorySummaryOut, ResponseHandler.get_single_success(category.name, category_id, category)))
+        if can_cache_reads(db, category_cache):
+            category_cache.set(("detail", category_id), response)
+        return response
+
+    @staticmethod
+    def evict_cache(key: str | None = None):
+        """
+        Utility dropping the cached category lists for the "list" key, otherwise every cached category
+        and the cached products since they embed their category.
+        """
+        if key == "list":
+            category_cache.delete_matching(lambda cache_key: cache_key[0] == "list")
+            return
+        category_cache.clear()
+        product_cache.clear()
+
+    @staticmethod
+    async def invalidate_cache(key: str | None = None):
+        # Evicts here and in every other worker.
+        await invalidation_bus.publish("categories", key)
 
     @staticmethod
-    def create_category(db: Session, category: CategoryCreate):
+    async def create_category(db: AsyncSession, category: CategoryCreate):
         db_category = Category(**category.model_dump())
         db.add(db_category)
-        db.commit()
-        db.refresh(db_category)
+        await db.commit()
+        await CategoryService.invalidate_cache("list")
+        await db.refresh(db_category)
         return ResponseHandler.create_success(db_category.name, db_category.id, db_category)
 
     @staticmethod
-    def update_category(db: Session, category_id: int, category: CategoryUpdate):
-        db_category = db.query(Category).filter(Category.id == category_id).first()
+    async def update_category(db: AsyncSession, category_id: int, category: CategoryUpdate):
+        db_category = await db.get(Category, category_id)
         if not db_category:
             ResponseHandler.not_found_error("Category", category_id)
-        for key, value in category.model_dump():
+        for key, value in category.model_dump().items():
             setattr(db_category, key, value)
-        db.commit()
-        db.refresh(db_category)
+        await db.commit()
+        await CategoryService.invalidate_cache()
+        await db.refresh(db_category)
         return ResponseHandler.update_success(db_category.name, db_category.id, db_category)
 
     @staticmethod
-    def delete_category(db: Session, category_id: int):
-        db_category = db.query(Category).filter(Category.id == category_id).first()
+    async def delete_category(db: AsyncSession, category_id: int):
+        db_category = await db.get(Category, category_id)
         if not db_category:
             ResponseHandler.not_found_error("Category", category_id)
-        db.delete(db_category)
-        db.commit()
+        await db.delete(db_category)
+        await db.commit()
+        await CategoryService.invalidate_cache()
         return ResponseHandler.delete_success(db_category.name, db_category.id, db_category)
 
 
+invalidation_bus.register("categories", CategoryService.evict_cache, category_cache, product_cache)
@@ -0,0 +1,263 @@
+"""
+Rebuilds the summary of every category from its products, e.g. after loading products outside of the API:
+
+    python -m app.services.facets
+"""
+import argparse
+import asyncio
+import math
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.database import get_engine, get_sessionmaker
+from app.models.models import EFFECTIVE_PRICE, Category, CategoryBrandCount, CategoryFacet, Product
+
+
+@dataclass(frozen=True)
+class FacetEntry:
+    """What the facets of its category count of one product."""
+    category_id: int
+    brand: str
+    price: float
+
+
+class CategoryFacetService:
+    """
+    Keeps the category_facets rollup: product count, effective price range and top brands of every
+    category, so category listings never aggregate the products. The product writes apply their
+    change to the rows of the categories they touch within their own transaction; rebuild()
+    recomputes every row.
+    """
+
+    @staticmethod
+    def effective_price():
+        return EFFECTIVE_PRICE
+
+    @staticmethod
+    def entry(product) -> FacetEntry:
+        """Utility taking the facet entry of a product, or of a product about to be created."""
+        return FacetEntry(
+            category_id=product.category_id,
+            brand=product.brand,
+            price=product.price * (1 - product.discount_percentage / 100),
+        )
+
+    @staticmethod
+    async def apply(db: AsyncSession, added=(), removed=()):
+        """
+        Utility updating the facets by the products added to and removed from their categories, an
+        updated product being removed with its old entry and added with its new one. The count, the
+        price sum and the brand counts move by delta; the price range is only recomputed, from the
+        category_id and effective price index, when a removed price was its minimum or maximum.
+        Each facets row is locked in category order, concurrent writes to one category apply one
+        after the other.
+        """
+        changes = defaultdict(lambda: {"count": 0, "price_sum": 0.0, "added": [], "removed": []})
+        brands = defaultdict(lambda: defaultdict(int))
+        for sign, entries in ((1, added), (-1, removed)):
+            for entry in entries:
+                change = changes[entry.category_id]
+                change["count"] += sign
+                change["price_sum"] += sign * entry.price
+                change["added" if sign > 0 else "removed"].append(entry.price)
+                brands[entry.category_id][entry.brand] += sign
+        if not changes:
+            return
+        # The session does not autoflush, a recomputed range has to see the caller's pending products.
+        await db.flush()
+
+        unsummarized = []
+        now = datetime.now(timezone.utc)
+        for category_id in sorted(changes):
+            result = await db.execute(
+                select(CategoryFacet.product_count, CategoryFacet.price_sum,
+                       CategoryFacet.min_price, CategoryFacet.max_price)
+                .filter(CategoryFacet.category_id == category_id)
+                .with_for_update()
+            )
+            facet = result.one_or_none()
+            if facet is None:
+                unsummarized.append(category_id)
+                continue
+
+            change = changes[category_id]
+            count = facet.product_count + change["count"]
+            price_sum = facet.price_sum + change["price_sum"]
+            min_price, max_price = facet.min_price, facet.max_price
+            if count <= 0:
+                count, price_sum, min_price, max_price = 0, 0.0, None, None
+            elif min_price is None or (change["removed"] and (
+                    _reached(min(change["removed"]), min_price) or _reached(max_price, max(change["removed"])))):
+                result = await db.execute(
+                    select(func.min(EFFECTIVE_PRICE), func.max(EFFECTIVE_PRICE))
+                    .filter(Product.category_id == category_id)
+                )
+                min_price, max_price = result.one()
+            elif change["added"]:
+                min_price = min(min_price, *change["added"])
+                max_price = max(max_price, *change["added"])
+
+            await CategoryFacetService._apply_brands(db, category_id, brands[category_id])
+            await db.execute(
+                update(CategoryFacet)
+                .where(CategoryFacet.category_id == category_id)
+                .values(
+                    product_count=count,
+                    price_sum=price_sum,
+                    min_price=min_price,
+                    max_price=max_price,
+                    avg_price=price_sum / count if count else None,
+                    top_brands=await CategoryFacetService._top_brands(db, category_id),
+                    updated_at=now,
+                )
+            )
+        # A category gets its row from the first product write that reaches it.
+        if unsummarized:
+            await CategoryFacetService.refresh(db, unsummarized)
+
+    @staticmethod
+    async def _apply_brands(db: AsyncSession, category_id: int, deltas):
+        added = [
+            {"category_id": category_id, "brand": brand, "product_count": delta}
+            for brand, delta in sorted(deltas.items()) if delta > 0
+        ]
+        if added:
+            dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+            stmt = dialect.insert(CategoryBrandCount)
+            await db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[CategoryBrandCount.category_id, CategoryBrandCount.brand],
+                    set_={"product_count": CategoryBrandCount.product_count + stmt.excluded.product_count},
+                ),
+                added,
+            )
+        removed = {brand: delta for brand, delta in deltas.items() if delta < 0}
+        if removed:
+            for brand, delta in sorted(removed.items()):
+                await db.execute(
+                    update(CategoryBrandCount)
+                    .where(CategoryBrandCount.category_id == category_id, CategoryBrandCount.brand == brand)
+                    .values(product_count=CategoryBrandCount.product_count + delta)
+                )
+            await db.execute(
+                delete(CategoryBrandCount)
+                .where(CategoryBrandCount.category_id == category_id, CategoryBrandCount.product_count <= 0)
+            )
+
+    @staticmethod
+    async def _top_brands(db: AsyncSession, category_id: int):
+        result = await db.execute(
+            select(CategoryBrandCount.brand, CategoryBrandCount.product_count)
+            .filter(CategoryBrandCount.category_id == category_id)
+            .order_by(CategoryBrandCount.product_count.desc(), CategoryBrandCount.brand)
+            .limit(settings.category_facet_top_brands)
+        )
+        return [{"brand": brand, "product_count": count} for brand, count in result]
+
+    @staticmethod
+    async def refresh(db: AsyncSession, category_ids):
+        """
+        Utility recomputing the facets and brand counts of the given categories from their products,
+        within the caller's transaction. The categories are locked in id order first, so concurrent
+        refreshes of one category run one after the other and the last one sees every product.
+        FOR NO KEY UPDATE leaves the product inserts free to reference the category meanwhile.
+        """
+        # The session does not autoflush, the caller's pending product changes have to be counted.
+        await db.flush()
+        result = await db.execute(
+            select(Category.id)
+            .filter(Category.id.in_(set(category_ids)))
+            .order_by(Category.id)
+            .with_for_update(key_share=True)
+        )
+        category_ids = result.scalars().all()
+        if not category_ids:
+            return
+
+        price = CategoryFacetService.effective_price()
+        totals = await db.execute(
+            select(Product.category_id, func.count(), func.min(price), func.max(price), func.sum(price))
+            .filter(Product.category_id.in_(category_ids))
+            .group_by(Product.category_id)
+        )
+        totals = {category_id: row for category_id, *row in totals}
+
+        brands = defaultdict(list)
+        result = await db.execute(
+            select(Product.category_id, Product.brand, func.count())
+            .filter(Product.category_id.in_(category_ids))
+            .group_by(Product.category_id, Product.brand)
+        )
+        for category_id, brand, count in result:
+            brands[category_id].append({"brand": brand, "product_count": count})
+
+        now = datetime.now(timezone.utc)
+        rows = []
+        brand_rows = []
+        for category_id in category_ids:
+            count, min_price, max_price, price_sum = totals.get(category_id, (0, None, None, 0.0))
+            top_brands = sorted(brands[category_id], key=lambda brand: (-brand["product_count"], brand["brand"]))
+            rows.append({
+                "category_id": category_id,
+                "product_count": count,
+                "min_price": min_price,
+                "max_price": max_price,
+                "avg_price": price_sum / count if count else None,
+                "price_sum": price_sum,
+                "top_brands": top_brands[:settings.category_facet_top_brands],
+                "updated_at": now,
+            })
+            brand_rows.extend({"category_id": category_id, **brand} for brand in top_brands)
+        await db.execute(delete(CategoryFacet).where(CategoryFacet.category_id.in_(category_ids)))
+        await db.execute(insert(CategoryFacet), rows)
+        await db.execute(delete(CategoryBrandCount).where(CategoryBrandCount.category_id.in_(category_ids)))
+        if brand_rows:
+            await db.execute(insert(CategoryBrandCount), brand_rows)
+
+    @staticmethod
+    async def rebuild(db: AsyncSession, batch_size: int = 500) -> int:
+        """
+        Utility recomputing the facets of every category, batch_size categories per transaction.
+        Returns the number of categories summarized.
+        """
+        summarized = 0
+        last_id = 0
+        while True:
+            result = await db.execute(
+                select(Category.id).filter(Category.id > last_id).order_by(Category.id).limit(batch_size))
+            category_ids = result.scalars().all()
+            if not category_ids:
+                return summarized
+            await CategoryFacetService.refresh(db, category_ids)
+            await db.commit()
+            summarized += len(category_ids)
+            last_id = category_ids[-1]
+
+
+def _reached(price: float, extreme: float) -> bool:
+    # price <= extreme, allowing for the rounding between the SQL and the Python effective price.
+    return price <= extreme or math.isclose(price, extreme)
+
+
+async def main(args):
+    # Imported here, the product service itself refreshes the facets through this module.
+    from app.services.products import ProductService
+
+    async with get_sessionmaker()() as db:
+        summarized = await CategoryFacetService.rebuild(db, args.batch_size)
+    # The running workers drop the categories they cached with the old facets.
+    await ProductService.invalidate_cache()
+    await get_engine().dispose()
+    print(f"Rebuilt the facets of {summarized} categories")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the facets of every category from its products.")
+    parser.add_argument("--batch-size", type=int, default=500, help="Categories refreshed per transaction")
+    asyncio.run(main(parser.parse_args()))
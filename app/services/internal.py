@@ -0,0 +1,27 @@
+from app.core.cache import caches
+from app.core.hashing import password_hash_pool
+from app.db.database import engines
+from app.db.pool import pool_statistics
+from app.db.replicas import get_replicas
+from app.utils.responses import ResponseHandler
+
+
+class InternalService:
+    @staticmethod
+    async def get_pool_stats():
+        stats = [pool_statistics(name, engine) for name, engine in engines.items()]
+        return ResponseHandler.success(f"Pool statistics for {len(stats)} engines", stats)
+
+    @staticmethod
+    async def get_replica_stats():
+        stats = [replica.stats() for replica in get_replicas()]
+        return ResponseHandler.success(f"Health of {len(stats)} read replicas", stats)
+
+    @staticmethod
+    async def get_cache_stats():
+        stats = [cache.stats() for cache in caches.values()]
+        return ResponseHandler.success(f"Statistics for {len(stats)} caches", stats)
+
+    @staticmethod
+    async def get_password_hash_stats():
+        return ResponseHandler.success("Password hashing pool statistics", password_hash_pool.stats())
@@ -0,0 +1,65 @@
+import csv
+import io
+import json
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.database import get_sessionmaker
+from app.models.models import Product
+from app.schemas.product import ProductCreate
+
+# Exported columns, the same ones the bulk import accepts so an export can be imported again.
+EXPORT_FIELDS = list(ProductCreate.model_fields)
+
+
+def serialize_value(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def ndjson_line(row) -> str:
+    return json.dumps({field: serialize_value(row[field]) for field in EXPORT_FIELDS}) + "\n"
+
+
+def csv_line(values) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+
+def csv_row(row) -> str:
+    return csv_line([
+        json.dumps(row[field]) if field == "images" else serialize_value(row[field])
+        for field in EXPORT_FIELDS
+    ])
+
+
+async def stream_products(file_format: str):
+    """
+    Streams every product, fetching them through a server-side cursor in batches of
+    product_export_batch_size rows and serializing each row as soon as it is fetched.
+    """
+    # The request session is closed once the response starts, so the stream uses its own.
+    async with get_sessionmaker()() as db:
+        if file_format == "csv":
+            yield csv_line(EXPORT_FIELDS)
+        serialize = csv_row if file_format == "csv" else ndjson_line
+
+        query = (select(*(getattr(Product, field) for field in EXPORT_FIELDS))
+                 .order_by(Product.id.asc())
+                 .execution_options(yield_per=settings.product_export_batch_size))
+        result = await db.stream(query)
+        async for rows in result.mappings().partitions():
+            yield "".join(serialize(row) for row in rows)
+
+
+class ProductExportService:
+    @staticmethod
+    def export_products(file_format: str):
+        media_type = "text/csv" if file_format == "csv" else "application/x-ndjson"
+        return StreamingResponse(
+            stream_products(file_format),
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="products.{file_format}"'},
+        )
@@ -0,0 +1,158 @@
+import csv
+import json
+
+from fastapi import Request
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.models import Category, Product
+from app.schemas.product import ProductCreate
+from app.services.facets import CategoryFacetService
+from app.services.products import ProductService
+from app.utils.responses import ResponseHandler
+
+CSV_CONTENT_TYPES = ("text/csv", "application/csv")
+
+
+async def iter_lines(request: Request):
+    """
+    Yields the decoded lines of the request body as it is received, without buffering the whole body.
+    """
+    remainder = b""
+    async for chunk in request.stream():
+        remainder += chunk
+        *lines, remainder = remainder.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8-sig").rstrip("\r")
+    if remainder:
+        yield remainder.decode("utf-8-sig").rstrip("\r")
+
+
+async def iter_ndjson_rows(request: Request):
+    async for line in iter_lines(request):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line), None
+        except ValueError as e:
+            yield None, f"Invalid JSON: {e}"
+
+
+async def iter_csv_rows(request: Request):
+    header = None
+    record = []
+    async for line in iter_lines(request):
+        record.append(line)
+        # A quoted field may span several lines, the record is complete once every quote is closed.
+        if sum(part.count('"') for part in record) % 2:
+            continue
+        values = next(csv.reader(["\n".join(record)]), [])
+        record = []
+        if not any(value.strip() for value in values):
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield None, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        row = dict(zip(header, values))
+        # Images are given as a JSON array or as a | separated list.
+        images = row.get("images", "")
+        try:
+            row["images"] = json.loads(images) if images.startswith("[") else [image for image in images.split("|") if image]
+        except ValueError as e:
+            yield None, f"images: Invalid JSON: {e}"
+            continue
+        yield row, None
+    if record:
+        yield None, "Unterminated quoted field"
+
+
+def format_validation_errors(error: ValidationError) -> list[str]:
+    return [f"{'.'.join(map(str, detail['loc'])) or 'row'}: {detail['msg']}" for detail in error.errors()]
+
+
+class ProductImportService:
+    @staticmethod
+    async def import_products(db: AsyncSession, request: Request):
+        content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+        rows = iter_csv_rows(request) if content_type in CSV_CONTENT_TYPES else iter_ndjson_rows(request)
+
+        chunk_size = settings.product_import_chunk_size
+        known_categories = set()
+        report = {"imported": 0, "failed": 0, "errors": []}
+
+        def fail(row_number: int, errors: list[str]):
+            report["failed"] += 1
+            report["errors"].append({"row": row_number, "errors": errors})
+
+        async def flush(chunk: list[tuple[int, ProductCreate]]):
+            # Every category of the chunk is checked with one query, known ones are remembered for the next chunks.
+            category_ids = {product.category_id for _, product in chunk} - known_categories
+            if category_ids:
+                result = await db.execute(select(Category.id).filter(Category.id.in_(category_ids)))
+                known_categories.update(result.scalars().all())
+
+            valid = []
+            for row_number, product in chunk:
+                if product.category_id not in known_categories:
+                    fail(row_number, [f"category_id: Category with {product.category_id} was not found!"])
+                else:
+                    valid.append((row_number, product))
+            if not valid:
+                return
+            try:
+                # One batched insert per chunk (executemany / multi-row VALUES).
+                await db.execute(insert(Product), [product.model_dump() for _, product in valid])
+                await CategoryFacetService.apply(db, added=[CategoryFacetService.entry(product) for _, product in valid])
+                await db.commit()
+                report["imported"] += len(valid)
+            except SQLAlchemyError:
+                await db.rollback()
+                await insert_one_by_one(valid)
+
+        async def insert_one_by_one(valid: list[tuple[int, ProductCreate]]):
+            # The batch failed on some row: every row is inserted on its own, so only the failing ones are reported.
+            imported = []
+            for row_number, product in valid:
+                try:
+                    await db.execute(insert(Product), [product.model_dump()])
+                    await db.commit()
+                    imported.append(CategoryFacetService.entry(product))
+                    report["imported"] += 1
+                except SQLAlchemyError as e:
+                    await db.rollback()
+                    fail(row_number, [f"Database error: {e.__class__.__name__}: {getattr(e, 'orig', None) or e}"])
+            if imported:
+                await CategoryFacetService.apply(db, added=imported)
+                await db.commit()
+
+        chunk = []
+        row_number = 0
+        try:
+            async for row, parse_error in rows:
+                row_number += 1
+                if parse_error:
+                    fail(row_number, [parse_error])
+                    continue
+                try:
+                    chunk.append((row_number, ProductCreate.model_validate(row)))
+                except ValidationError as e:
+                    fail(row_number, format_validation_errors(e))
+                if len(chunk) >= chunk_size:
+                    await flush(chunk)
+                    chunk = []
+            if chunk:
+                await flush(chunk)
+        except UnicodeDecodeError:
+            ResponseHandler.bad_request_error(f"Row {row_number + 1} is not valid UTF-8")
+        finally:
+            if report["imported"]:
+                await ProductService.invalidate_cache()
+
+        message = f"Imported {report['imported']} products, {report['failed']} rows failed"
+        return ResponseHandler.success(message, report)
@@ -1,67 +1,162 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 
+from app.core.cache import category_cache, product_cache
+from app.core.invalidation import invalidation_bus
+from app.db.replicas import can_cache_reads
+from app.db.search import search_products
 from app.models.models import Product, Category
-from app.schemas.product import ProductCreate, ProductUpdate
+from app.schemas.product import ProductCreate, ProductOut, ProductsOut, ProductUpdate
+from app.services.facets import CategoryFacetService
+from app.utils.pagination import paginate, page_items
 from app.utils.responses import ResponseHandler
+from app.utils.serialization import RenderedJSON, render_json
 
 
 class ProductService:
     @staticmethod
-    def get_all_products(
-            db: Session,
+    async def get_all_products(
+            db: AsyncSession,
             page: int,
             limit: int,
             search: str = "",
+            cursor: str | None = None,
     ):
-        products = (db.query(Product)
-                    .order_by(Product.id.asc())
-                    .filter(Product.title.contains(search))
-                    .offset((page - 1) * limit)
-                    .limit(limit).all())
-        return {"message": f"page {page} with {limit} products", "data": products}
+        cache_key = ("list", page, limit, search, cursor)
+        response = product_cache.get(cache_key)
+        if response is not None:
+            return response
+
+        keyset = (Product.id,)
+        query = select(Product).options(*ProductService.product_loader_options())
+        if search:
+            # Search results are ordered by relevance, so they are paged with page/limit only.
+            query = search_products(query, db.bind.dialect.name, search)
+            result = await db.execute(query.offset((page - 1) * limit).limit(limit))
+            products, next_cursor = result.scalars().all(), None
+        else:
+            result = await db.execute(paginate(query, keyset, page, limit, cursor))
+            products, next_cursor = page_items(result.scalars().all(), keyset, limit)
+        # Cached rendered, hits are sent without validating or serializing again.
+        response = RenderedJSON(render_json(ProductsOut, {
+            "message": f"page {page} with {limit} products", "data": products, "next_cursor": next_cursor}))
+        if can_cache_reads(db, product_cache):
+            product_cache.set(cache_key, response)
+        return response
+
+    @staticmethod
+    def product_loader_options():
+        """
+        Utility returning the loader options matching ProductBase: the category is joined in the same query.
+        """
+        return (joinedload(Product.category, innerjoin=True),)
+
+    @staticmethod
+    async def get_product(db: AsyncSession, product_id: int) -> Product | None:
+        """
+        Utility to fetch a product together with the category it is serialized with.
+        """
+        result = await db.execute(
+            select(Product).options(*ProductService.product_loader_options()).filter(Product.id == product_id)
+        )
+        return result.scalars().first()
 
     @staticmethod
-    def get_product_by_id(db: Session, product_id: int):
-        product = db.query(Product).filter(Product.id == product_id).first()
+    async def get_product_by_id(db: AsyncSession, product_id: int):
+        response = product_cache.get(("detail", product_id))
+        if response is not None:
+            return response
+
+        product = await ProductService.get_product(db, product_id)
         if not product:
             ResponseHandler.not_found_error("Product",product_id)
-        return ResponseHandler.get_single_success(product.title, product_id, product)
+        response = RenderedJSON(render_json(
+            ProductOut, ResponseHandler.get_single_success(product.title, product_id, product)))
+        if can_cache_reads(db, product_cache):
+            product_cache.set(("detail", product_id), response)
+        return response
+
+    @staticmethod
+    def evict_cache(product_id: int | None = None):
+        """
+        Utility dropping the cached product lists, and the cached details of the product if given.
+        The cached categories go as well, their facets summarize the products.
+        """
+        if product_id is not None:
+            product_cache.delete(("detail", product_id))
+        product_cache.delete_matching(lambda key: key[0] == "list")
+        category_cache.clear()
 
     @staticmethod
-    def create_product(db: Session, product: ProductCreate):
+    async def invalidate_cache(product_id: int | None = None):
+        # Evicts here and in every other worker.
+        await invalidation_bus.publish("products", product_id)
+
+    @staticmethod
+    def evict_stock(product_ids: list[int]):
+        """
+        Utility dropping the cached details of the products whose stock changed, and the cached product lists.
+        The categories stay, their facets do not depend on stock.
+        """
+        for product_id in product_ids:
+            product_cache.delete(("detail", product_id))
+        product_cache.delete_matching(lambda key: key[0] == "list")
+
+    @staticmethod
+    async def invalidate_stock(product_ids: list[int]):
+        await invalidation_bus.publish("product_stock", product_ids)
+
+    @staticmethod
+    async def create_product(db: AsyncSession, product: ProductCreate):
         # First find if the category exists
-        category_exists = db.query(Category).filter(Category.id == product.category_id).first()
+        category_exists = await db.get(Category, product.category_id)
         if not category_exists:
             ResponseHandler.not_found_error("Category",product.category_id)
 
         db_product = Product(**product.model_dump())
         db.add(db_product)
-        db.commit()
-        db.refresh(db_product)
+        await CategoryFacetService.apply(db, added=[CategoryFacetService.entry(db_product)])
+        await db.commit()
+        await ProductService.invalidate_cache()
+        db_product = await ProductService.get_product(db, db_product.id)
         return ResponseHandler.create_success(db_product.title, db_product.id, db_product)
 
     @staticmethod
-    def update_product(
-            db: Session,
+    async def update_product(
+            db: AsyncSession,
             product_id: int,
             product: ProductUpdate,
     ):
         # First find the existing product
-        db_product = db.query(Product).filter(Product.id == product_id).first()
+        db_product = await ProductService.get_product(db, product_id)
         if not db_product:
             ResponseHandler.not_found_error("Product",product_id)
         # Update the corresponding object accordingly.
+        previous_entry = CategoryFacetService.entry(db_product)
         for key, value in product.model_dump().items():
             setattr(db_product, key, value)
-        db.commit()
-        db.refresh(db_product)
+        entry = CategoryFacetService.entry(db_product)
+        if entry != previous_entry:
+            await CategoryFacetService.apply(db, added=[entry], removed=[previous_entry])
+        await db.commit()
+        await ProductService.invalidate_cache(product_id)
+        # The category may have changed, so load the product again with its category.
+        db.expire(db_product)
+        db_product = await ProductService.get_product(db, product_id)
         return ResponseHandler.update_success(db_product.title, db_product.id, db_product)
 
     @staticmethod
-    def delete_product(db: Session, product_id: int):
-        db_product = db.query(Product).filter(Product.id == product_id).first()
+    async def delete_product(db: AsyncSession, product_id: int):
+        db_product = await ProductService.get_product(db, product_id)
         if not db_product:
             ResponseHandler.not_found_error("Product",product_id)
-        db.delete(db_product)
-        db.commit()
+        await db.delete(db_product)
+        await CategoryFacetService.apply(db, removed=[CategoryFacetService.entry(db_product)])
+        await db.commit()
+        await ProductService.invalidate_cache(product_id)
         return ResponseHandler.delete_success(db_product.title, db_product.id, db_product)
+
+
+invalidation_bus.register("products", ProductService.evict_cache, product_cache)
+invalidation_bus.register("product_stock", ProductService.evict_stock, product_cache)
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.database import get_sessionmaker
+from app.models.models import Cart, CartItem, Product
+from app.services.products import ProductService
+from app.utils.responses import ResponseHandler
+
+logger = logging.getLogger(__name__)
+
+
+class StockService:
+    """
+    Reserves product stock for cart lines. Product.stock is the quantity still available: a
+    reservation takes units out of it with one conditional UPDATE, which either succeeds or
+    matches no row, so concurrent carts can never oversell a product and never wait on a read
+    of its row. A reserved line has reserved_until set; its quantity goes back to the product
+    when the line or its cart is removed, or once the reservation expired.
+
+    The products whose stock a session changed are collected in db.info["stock_changed"], the
+    caller evicts their cached copies with invalidate_cache() once it committed.
+    """
+
+    @staticmethod
+    def reservation_expiry() -> datetime:
+        return datetime.now(timezone.utc) + timedelta(seconds=settings.stock_reservation_ttl_seconds)
+
+    @staticmethod
+    async def reserve(db: AsyncSession, quantities: dict[int, int]):
+        """
+        Utility taking the given quantity of every product out of its stock, within the caller's transaction.
+        Negative quantities are given back. Products are updated in id order so two carts changing the
+        same products never deadlock. Raises a 409 when a product runs out, the request's rollback then
+        releases what was already reserved.
+        """
+        changed = db.info.setdefault("stock_changed", set())
+        for product_id in sorted(quantities):
+            quantity = quantities[product_id]
+            if quantity:
+                changed.add(product_id)
+            if quantity > 0:
+                result = await db.execute(
+                    update(Product)
+                    .where(Product.id == product_id, Product.stock >= quantity)
+                    .values(stock=Product.stock - quantity)
+                    .returning(Product.id)
+                )
+                if result.scalar_one_or_none() is None:
+                    ResponseHandler.conflict_error(f"Not enough stock left for product {product_id}")
+            elif quantity < 0:
+                await db.execute(
+                    update(Product).where(Product.id == product_id).values(stock=Product.stock - quantity)
+                )
+
+    @staticmethod
+    async def adjust_stock(db: AsyncSession, product_id: int, delta: int):
+        """
+        Utility adding units to, or writing units off, the available stock of a product with one conditional
+        UPDATE, so units reserved meanwhile are never made sellable again nor taken twice.
+        """
+        result = await db.execute(
+            update(Product)
+            .where(Product.id == product_id, Product.stock + delta >= 0)
+            .values(stock=Product.stock + delta)
+            .returning(Product.id)
+        )
+        if result.scalar_one_or_none() is None:
+            if await db.get(Product, product_id) is None:
+                ResponseHandler.not_found_error("Product", product_id)
+            ResponseHandler.conflict_error(f"Not enough stock left to remove {-delta} units of product {product_id}")
+        db.info.setdefault("stock_changed", set()).add(product_id)
+        await db.commit()
+        await StockService.invalidate_cache(db)
+        db_product = await ProductService.get_product(db, product_id)
+        return ResponseHandler.update_success(db_product.title, db_product.id, db_product)
+
+    @staticmethod
+    async def invalidate_cache(db: AsyncSession):
+        """
+        Utility evicting the cached products whose stock the committed transaction changed, in every worker.
+        """
+        product_ids = db.info.pop("stock_changed", None)
+        if product_ids:
+            await ProductService.invalidate_stock(sorted(product_ids))
+
+    @staticmethod
+    async def release(db: AsyncSession, quantities: dict[int, int]):
+        await StockService.reserve(db, {product_id: -quantity for product_id, quantity in quantities.items()})
+
+    @staticmethod
+    async def reserved_quantities(db: AsyncSession, *criteria) -> Counter:
+        """
+        Utility summing the reserved quantity per product of the cart lines matching the criteria.
+        The lines are locked until commit so the expiry sweeper can not release them in the meantime.
+        """
+        result = await db.execute(
+            select(CartItem.product_id, CartItem.quantity)
+            .filter(CartItem.reserved_until.is_not(None), *criteria)
+            .with_for_update()
+        )
+        quantities = Counter()
+        for product_id, quantity in result:
+            quantities[product_id] += quantity
+        return quantities
+
+    @staticmethod
+    async def replace_cart(db: AsyncSession, cart_id: int, quantities: dict[int, int]):
+        """
+        Utility moving the reservations of a cart to the given quantities, applying only the difference per product.
+        """
+        held = await StockService.reserved_quantities(db, CartItem.cart_id == cart_id)
+        await StockService.reserve(
+            db, {product_id: quantities.get(product_id, 0) - held[product_id] for product_id in {*quantities, *held}})
+
+    @staticmethod
+    async def release_cart(db: AsyncSession, cart_id: int):
+        await StockService.release(db, await StockService.reserved_quantities(db, CartItem.cart_id == cart_id))
+
+    @staticmethod
+    async def release_user(db: AsyncSession, user_id: int):
+        carts = select(Cart.id).filter(Cart.user_id == user_id)
+        await StockService.release(db, await StockService.reserved_quantities(db, CartItem.cart_id.in_(carts)))
+
+    @staticmethod
+    async def release_expired(db: AsyncSession, batch_size: int = None) -> int:
+        """
+        Utility giving the stock of expired reservations back, one batch per transaction.
+        Lines of a cart a request is changing right now are skipped rather than waited for (SKIP LOCKED
+        on Postgres), so several app instances can sweep at the same time. Returns the lines released.
+        """
+        batch_size = batch_size or settings.stock_reservation_sweep_batch_size
+        released = 0
+        while True:
+            result = await db.execute(
+                select(CartItem.id, CartItem.product_id, CartItem.quantity)
+                .join(Cart, Cart.id == CartItem.cart_id)
+                .filter(CartItem.reserved_until < datetime.now(timezone.utc))
+                .order_by(CartItem.id)
+                .limit(batch_size)
+                .with_for_update(of=(CartItem, Cart), skip_locked=True)
+            )
+            lines = result.all()
+            if not lines:
+                return released
+
+            quantities = Counter()
+            for _, product_id, quantity in lines:
+                quantities[product_id] += quantity
+            await db.execute(
+                update(CartItem).where(CartItem.id.in_([line.id for line in lines])).values(reserved_until=None)
+            )
+            await StockService.release(db, quantities)
+            await db.commit()
+            await StockService.invalidate_cache(db)
+            released += len(lines)
+            if len(lines) < batch_size:
+                return released
+
+
+async def sweep_expired_reservations():
+    """
+    Background task of the app releasing expired reservations every stock_reservation_sweep_interval_seconds.
+    """
+    while True:
+        await asyncio.sleep(settings.stock_reservation_sweep_interval_seconds)
+        try:
+            async with get_sessionmaker()() as db:
+                released = await StockService.release_expired(db)
+            if released:
+                logger.info(f"Released {released} expired stock reservations")
+        except (OSError, SQLAlchemyError) as e:
+            logger.warning(f"Releasing expired stock reservations failed: {e.__class__.__name__}: {e}")
@@ -1,56 +1,65 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.security import hash_password
+from app.core.hashing import hash_password_async
+from app.core.security import invalidate_principal
 from app.models.models import User
 from app.schemas.users import UserCreate, UserUpdate
+from app.services.stock import StockService
+from app.utils.pagination import paginate, page_items
 from app.utils.responses import ResponseHandler
 
 
 class UsersService:
     # Getting users through pagination: page, limit  and searchString
     @staticmethod
-    def get_all_users(db: Session, page: int, limit: int, search: str = "", role: str = 'user'):
-        users = db.query(User).order_by(User.id.asc()).filter(User.username.contains(search), User.role == role).limit(limit).offset((page - 1) * limit).all()
-        return {"message": f"page {page} with {limit} users", "data": users}
+    async def get_all_users(db: AsyncSession, page: int, limit: int, search: str = "", role: str = 'user', cursor: str | None = None):
+        keyset = (User.id,)
+        query = select(User).filter(User.username.contains(search), User.role == role)
+        result = await db.execute(paginate(query, keyset, page, limit, cursor))
+        users, next_cursor = page_items(result.scalars().all(), keyset, limit)
+        return {"message": f"page {page} with {limit} users", "data": users, "next_cursor": next_cursor}
 
     @staticmethod
-    def get_user(db: Session, user_id):
-        user = db.query(User).filter(User.id == user_id).first()
+    async def get_user(db: AsyncSession, user_id):
+        user = await db.get(User, user_id)
         if not user:
             ResponseHandler.not_found_error("User", user_id)
         return ResponseHandler.get_single_success(user.username, user_id, user)
 
     @staticmethod
-    def create_user(db: Session, user: UserCreate):
-        user.password = hash_password(user.password)
+    async def create_user(db: AsyncSession, user: UserCreate):
+        user.password = await hash_password_async(user.password)
         new_user = User(**user.model_dump())
         db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        await db.commit()
+        await db.refresh(new_user)
         return ResponseHandler.create_success(new_user.username, new_user.id, new_user)
 
     @staticmethod
-    def update_user(db: Session, user_id: int, updated_user: UserUpdate):
-        db_user = db.query(User).filter(User.id == user_id).first()
+    async def update_user(db: AsyncSession, user_id: int, updated_user: UserUpdate):
+        db_user = await db.get(User, user_id)
         if not db_user:
             ResponseHandler.not_found_error("User", user_id)
 
+        updated_user.password = await hash_password_async(updated_user.password)
         for key, value in updated_user.model_dump().items():
             setattr(db_user, key, value)
 
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await invalidate_principal(db_user.id)
+        await db.refresh(db_user)
         return ResponseHandler.update_success(db_user.username, db_user.id, db_user)
 
     @staticmethod
-    def delete_user(db: Session, user_id: int):
-        db_user = db.query(User).filter(User.id == user_id).first()
+    async def delete_user(db: AsyncSession, user_id: int):
+        db_user = await db.get(User, user_id)
         if not db_user:
             ResponseHandler.not_found_error("User", user_id)
-        db.delete(db_user)
-        db.commit()
+        # Carts go with the user, give the stock they reserved back first
+        await StockService.release_user(db, db_user.id)
+        await db.delete(db_user)
+        await db.commit()
+        await StockService.invalidate_cache(db)
+        await invalidate_principal(db_user.id)
         return ResponseHandler.delete_success(db_user.username, db_user.id, db_user)
-
-
-
-
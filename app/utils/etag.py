@@ -0,0 +1,36 @@
+import hashlib
+
+from fastapi import Request, Response
+from starlette import status
+
+from app.core.config import settings
+from app.utils.serialization import render_json
+
+
+def compute_etag(body: bytes) -> str:
+    # Strong validator derived from the response body, equal bodies always get the same tag.
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(etag: str, if_none_match: str | None) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # If-None-Match uses the weak comparison, so W/ prefixed tags match as well.
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def conditional_response(request: Request, model, content, max_age: int | None = None) -> Response:
+    """
+    Renders a cacheable GET response with its ETag and Cache-Control headers,
+    or answers with 304 Not Modified when the client already holds this version.
+    """
+    max_age = settings.catalog_cache_max_age if max_age is None else max_age
+    body = render_json(model, content)
+    headers = {
+        "ETag": compute_etag(body),
+        "Cache-Control": f"public, max-age={max_age}, must-revalidate",
+    }
+    if etag_matches(headers["ETag"], request.headers.get("if-none-match")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(body, headers=headers, media_type="application/json")
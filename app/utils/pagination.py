@@ -0,0 +1,56 @@
+import base64
+import json
+
+from sqlalchemy import tuple_
+
+from app.utils.responses import ResponseHandler
+
+
+# Opaque cursor holding the sort key values of the last row of a page.
+def encode_cursor(values) -> str:
+    raw = json.dumps(list(values), separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        ResponseHandler.bad_request_error("Invalid pagination cursor")
+    return values
+
+
+def paginate(query, columns, page: int, limit: int, cursor: str | None = None):
+    """
+    Orders the query by the keyset columns and restricts it to a single page.
+
+    With a cursor the page starts right after the row the cursor points to, so the
+    database seeks through the index instead of scanning and discarding earlier rows.
+    Without one the page/limit offset is kept for backwards compatibility.
+    One extra row is fetched to know whether a next page exists.
+    """
+    query = query.order_by(*(column.asc() for column in columns))
+    if cursor:
+        values = decode_cursor(cursor, len(columns))
+        if len(columns) == 1:
+            query = query.where(columns[0] > values[0])
+        else:
+            query = query.where(tuple_(*columns) > tuple_(*values))
+    else:
+        query = query.offset((page - 1) * limit)
+    return query.limit(limit + 1)
+
+
+def page_items(rows, columns, limit: int):
+    """
+    Splits the fetched rows into the page and the cursor of the next page, if any.
+    """
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    next_cursor = encode_cursor(getattr(rows[-1], column.key) for column in columns)
+    return rows, next_cursor
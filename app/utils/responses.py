@@ -31,6 +31,18 @@ class ResponseHandler:
         message = f"{entity_name} with {id} was not found!"
         raise HTTPException(status_code=404, detail=message)
 
+    @staticmethod
+    def bad_request_error(message=""):
+        raise HTTPException(status_code=400, detail=message)
+
+    @staticmethod
+    def conflict_error(message=""):
+        raise HTTPException(status_code=409, detail=message)
+
+    @staticmethod
+    def server_error(message=""):
+        raise HTTPException(status_code=500, detail=message)
+
     @staticmethod
     def auth_bad_request_error():
         message = f"Incorrect username or password"
@@ -0,0 +1,38 @@
+from dataclasses import dataclass
+from functools import lru_cache
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+@lru_cache(maxsize=None)
+def type_adapter(model) -> TypeAdapter:
+    # Building the validator and serializer of a model is costly, so it is done once per model.
+    return TypeAdapter(model)
+
+
+@dataclass(frozen=True)
+class RenderedJSON:
+    """
+    Response content already validated and serialized, e.g. kept in a cache: it is sent as is.
+    """
+    body: bytes
+
+
+def render_json(model, content) -> bytes:
+    """
+    Validates the content against the response model once, reading ORM objects through their
+    attributes, and serializes it to JSON bytes in a single pass. Rendered content is used as is.
+    """
+    if isinstance(content, RenderedJSON):
+        return content.body
+    adapter = type_adapter(model)
+    return adapter.dump_json(adapter.validate_python(content, from_attributes=True))
+
+
+def json_response(model, content, status_code: int = 200, headers: dict | None = None) -> Response:
+    """
+    Response that FastAPI sends as is: it skips validating the returned content against
+    the route response_model a second time and encoding it again.
+    """
+    return Response(render_json(model, content), status_code=status_code, headers=headers, media_type="application/json")
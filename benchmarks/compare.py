@@ -0,0 +1,43 @@
+"""
+Compares two benchmark reports endpoint by endpoint, e.g. the runs of two commits.
+
+    python -m benchmarks.compare before.json after.json
+"""
+import argparse
+import json
+
+METRICS = [("throughput_rps", "req/s"), ("p50", "p50 ms"), ("p95", "p95 ms"), ("p99", "p99 ms")]
+
+
+def metric(summary: dict, name: str) -> float:
+    return summary[name] if name == "throughput_rps" else summary["latency_ms"][name]
+
+
+def change(before: float, after: float) -> str:
+    if not before:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def compare(before: dict, after: dict):
+    print(f"before: {before['meta'].get('git_commit')}  after: {after['meta'].get('git_commit')}")
+    header = f"{'endpoint':<20}" + "".join(f"{label:>30}" for _, label in METRICS)
+    print(header)
+    for name, after_summary in after["endpoints"].items():
+        before_summary = before["endpoints"].get(name)
+        if before_summary is None:
+            continue
+        cells = []
+        for key, _ in METRICS:
+            old, new = metric(before_summary, key), metric(after_summary, key)
+            cells.append(f"{old:.1f} -> {new:.1f} ({change(old, new)})".rjust(30))
+        print(f"{name:<20}" + "".join(cells))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports.")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+    with open(args.before) as before_file, open(args.after) as after_file:
+        compare(json.load(before_file), json.load(after_file))
@@ -0,0 +1,178 @@
+"""
+Flash sale benchmark: concurrent clients add the same product to their carts until its stock is
+sold out, then the report gives the throughput and latency of the reservations and checks that
+exactly the initial stock was reserved, never more. --skus spreads the load over several products
+for comparison with the single hot one.
+
+    DATABASE_URL=sqlite+aiosqlite:///./bench.db python -m benchmarks.reservations --concurrency 64 --stock 1000
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+import httpx
+from sqlalchemy import delete, insert, select
+
+from app.core.config import settings
+from app.db.database import engine
+from app.models.models import Category, Product
+from benchmarks.run import bearer, git_commit, load_context, login, percentile
+
+HOT_SKU_TITLE = "bench_hot_sku"
+
+
+async def create_skus(count: int, stock: int) -> list[int]:
+    async with engine.begin() as conn:
+        category_id = (await conn.execute(select(Category.id).limit(1))).scalar_one()
+        # Drops the products of an earlier run, their cart lines go with them.
+        await conn.execute(delete(Product).where(Product.title == HOT_SKU_TITLE))
+        result = await conn.execute(insert(Product).returning(Product.id, sort_by_parameter_order=True), [{
+            "title": HOT_SKU_TITLE,
+            "description": "flash sale",
+            "price": 100,
+            "discount_percentage": 0,
+            "rating": 5,
+            "stock": stock,
+            "brand": "bench",
+            "thumbnail": "https://cdn.bench.example.com/hot.jpg",
+            "images": [],
+            "category_id": category_id,
+        } for _ in range(count)])
+        return result.scalars().all()
+
+
+async def remaining_stock(product_ids: list[int]) -> dict[int, int]:
+    async with engine.connect() as conn:
+        result = await conn.execute(select(Product.id, Product.stock).filter(Product.id.in_(product_ids)))
+        return dict(result.all())
+
+
+async def benchmark(args) -> dict:
+    ctx = await load_context(args.concurrency)
+    ctx.clients = [client for client in ctx.clients if client["cart_ids"]]
+    if not ctx.clients:
+        raise SystemExit("The benchmark users have no carts, run python -m benchmarks.seed with --carts-per-user first.")
+    product_ids = await create_skus(args.skus, args.stock)
+
+    if not args.rate_limit:
+        # Every client shares one IP in process, measure the endpoints rather than the limiter.
+        settings.rate_limit_enabled = False
+    if args.base_url:
+        transport, base_url, lifespan = None, args.base_url, None
+    else:
+        from main import app
+        transport, base_url, lifespan = httpx.ASGITransport(app=app), "http://benchmark", app.router.lifespan_context(app)
+
+    latencies = []
+    statuses = Counter()
+    attempts = itertools.count()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        if lifespan is not None:
+            await lifespan.__aenter__()
+        try:
+            for client_ctx in ctx.clients:
+                client_ctx["token"] = await login(client, client_ctx["username"])
+
+            async def worker(number: int):
+                client_ctx = ctx.clients[number % len(ctx.clients)]
+                cart_id = client_ctx["cart_ids"][number // len(ctx.clients) % len(client_ctx["cart_ids"])]
+                # Stops after the sale is over, or after the attempt budget when the stock is never sold out.
+                while (attempt := next(attempts)) < args.max_attempts:
+                    product_id = product_ids[attempt % len(product_ids)]
+                    start = time.perf_counter()
+                    response = await client.post(
+                        f"/cart/{cart_id}/items", headers=bearer(client_ctx["token"]),
+                        json={"product_id": product_id, "quantity": args.quantity})
+                    latencies.append(time.perf_counter() - start)
+                    statuses[response.status_code] += 1
+                    if statuses[409] >= args.concurrency * len(product_ids):
+                        return
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker(number) for number in range(args.concurrency)))
+            elapsed = time.perf_counter() - start
+        finally:
+            if lifespan is not None:
+                await lifespan.__aexit__(None, None, None)
+
+    stock = await remaining_stock(product_ids)
+    reserved = sum(args.stock - left for left in stock.values())
+    latencies.sort()
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "database": engine.dialect.name,
+            "target": args.base_url or "in-process",
+            "concurrency": args.concurrency,
+            "skus": args.skus,
+            "stock_per_sku": args.stock,
+            "quantity": args.quantity,
+            "python": platform.python_version(),
+        },
+        "endpoints": {
+            "reservations.add_item": {
+                "method": "POST",
+                "requests": len(latencies),
+                "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+                "duration_seconds": round(elapsed, 3),
+                "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+                "reserved_per_second": round(statuses[201] / elapsed, 2) if elapsed else 0.0,
+                "latency_ms": {
+                    "mean": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+                    "p50": round(percentile(latencies, 50) * 1000, 3),
+                    "p95": round(percentile(latencies, 95) * 1000, 3),
+                    "p99": round(percentile(latencies, 99) * 1000, 3),
+                    "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+                },
+            },
+        },
+        "stock": {
+            "initial": args.stock * args.skus,
+            "reserved": reserved,
+            "remaining": sum(stock.values()),
+            # Every accepted request reserved its quantity, and never more than the stock was reserved.
+            "consistent": reserved == statuses[201] * args.quantity and all(left >= 0 for left in stock.values()),
+        },
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark concurrent stock reservations of a flash sale.")
+    parser.add_argument("--concurrency", type=int, default=64, help="Concurrent clients")
+    parser.add_argument("--stock", type=int, default=1000, help="Initial stock of every product on sale")
+    parser.add_argument("--skus", type=int, default=1, help="Products on sale, 1 for a single hot product")
+    parser.add_argument("--quantity", type=int, default=1, help="Quantity added per request")
+    parser.add_argument("--max-attempts", type=int, default=100_000, help="Requests sent at most")
+    parser.add_argument("--base-url", help="Benchmark a running server instead of the app in process")
+    parser.add_argument("--rate-limit", action="store_true", help="Keep rate limiting on for the app in process")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--output", help="File the JSON report is written to, printed when omitted")
+    return parser.parse_args(argv)
+
+
+async def main(args):
+    report = await benchmark(args)
+    await engine.dispose()
+    summary = report["endpoints"]["reservations.add_item"]
+    print(f"  {summary['throughput_rps']:.1f} req/s, {summary['reserved_per_second']:.1f} reservations/s  "
+          f"p50 {summary['latency_ms']['p50']:.2f} ms  p99 {summary['latency_ms']['p99']:.2f} ms  "
+          f"reserved {report['stock']['reserved']}/{report['stock']['initial']}  "
+          f"consistent {report['stock']['consistent']}")
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+        print(f"Report written to {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
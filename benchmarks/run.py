@@ -0,0 +1,270 @@
+"""
+Drives every router of the application with concurrent clients and reports throughput and
+latency percentiles per endpoint as JSON. Runs in process through the ASGI app by default,
+or against a running server with --base-url (sharing the DATABASE_URL the data was seeded into).
+
+    DATABASE_URL=sqlite+aiosqlite:///./bench.db python -m benchmarks.run --concurrency 16 --output results.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import platform
+import random
+import subprocess
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable
+
+import httpx
+from sqlalchemy import func, select
+
+from app.core.config import settings
+from app.db.database import engine
+from app.models.models import Cart, Category, Product, User
+from benchmarks.seed import ADMIN_USERNAME, BENCHMARK_PASSWORD, WORDS, username
+
+SAMPLED_PRODUCTS = 10_000
+
+
+@dataclass
+class Context:
+    """
+    Ids and tokens the endpoints pick their parameters from.
+    """
+    product_ids: list[int]
+    category_ids: list[int]
+    user_ids: list[int]
+    admin_token: str = ""
+    # Token and cart ids of every benchmark client, client n uses clients[n % len(clients)].
+    clients: list[dict] = field(default_factory=list)
+    signups: itertools.count = field(default_factory=itertools.count)
+    run_id: str = field(default_factory=lambda: str(int(time.time())))
+
+
+@dataclass
+class Endpoint:
+    name: str
+    method: str
+    # Builds the path and the request keyword arguments of one call.
+    build: Callable
+    auth: str | None = None
+
+
+def bearer(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+ENDPOINTS = [
+    Endpoint("auth.token", "POST", lambda ctx, client, rng: (
+        "/auth/token", {"data": {"username": client["username"], "password": BENCHMARK_PASSWORD}})),
+    Endpoint("auth.signup", "POST", lambda ctx, client, rng: (
+        "/auth/signup", {"json": signup_payload(ctx)})),
+    Endpoint("account.me", "GET", lambda ctx, client, rng: ("/account/me", {}), auth="user"),
+    Endpoint("users.list", "GET", lambda ctx, client, rng: (
+        f"/users/?page={rng.randint(1, 20)}&limit=20", {}), auth="admin"),
+    Endpoint("users.detail", "GET", lambda ctx, client, rng: (
+        f"/users/{rng.choice(ctx.user_ids)}", {}), auth="admin"),
+    Endpoint("categories.list", "GET", lambda ctx, client, rng: ("/categories/?limit=20", {})),
+    Endpoint("categories.detail", "GET", lambda ctx, client, rng: (
+        f"/categories/{rng.choice(ctx.category_ids)}", {})),
+    Endpoint("products.list", "GET", lambda ctx, client, rng: (
+        f"/products/?page={rng.randint(1, 100)}&limit=20", {})),
+    Endpoint("products.search", "GET", lambda ctx, client, rng: (
+        f"/products/?search={rng.choice(WORDS)}&limit=20", {})),
+    Endpoint("products.detail", "GET", lambda ctx, client, rng: (
+        f"/products/{rng.choice(ctx.product_ids)}", {})),
+    Endpoint("cart.list", "GET", lambda ctx, client, rng: ("/cart/", {}), auth="user"),
+    Endpoint("cart.detail", "GET", lambda ctx, client, rng: (
+        f"/cart/{rng.choice(client['cart_ids'])}", {}), auth="user"),
+    Endpoint("cart.create", "POST", lambda ctx, client, rng: (
+        "/cart/", {"json": {"cart_items": [
+            {"product_id": product_id, "quantity": rng.randint(1, 5)}
+            for product_id in rng.sample(ctx.product_ids, 3)
+        ]}}), auth="user"),
+    Endpoint("cart.add_item", "POST", lambda ctx, client, rng: (
+        f"/cart/{rng.choice(client['cart_ids'])}/items",
+        {"json": {"product_id": rng.choice(ctx.product_ids), "quantity": rng.randint(1, 5)}}), auth="user"),
+    Endpoint("internal.pool", "GET", lambda ctx, client, rng: ("/internal/pool", {}), auth="admin"),
+    Endpoint("metrics", "GET", lambda ctx, client, rng: ("/metrics", {})),
+]
+
+
+def signup_payload(ctx: Context) -> dict:
+    name = f"bench_signup_{ctx.run_id}_{next(ctx.signups)}"
+    return {"full_name": name, "username": name, "email": f"{name}@bench.example.com", "password": BENCHMARK_PASSWORD}
+
+
+def percentile(sorted_values: list[float], percent: float) -> float:
+    # Nearest rank, so every reported value is a latency that was actually observed.
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(percent / 100 * len(sorted_values)) - 1)]
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def load_context(clients: int) -> Context:
+    """
+    Utility reading the ids the seeded database contains, the requests then spread over them.
+    """
+    async with engine.connect() as conn:
+        product_ids = (await conn.execute(
+            select(Product.id).order_by(func.random()).limit(SAMPLED_PRODUCTS))).scalars().all()
+        category_ids = (await conn.execute(select(Category.id))).scalars().all()
+        user_ids = (await conn.execute(
+            select(User.id).filter(User.username.like("bench_user_%")).order_by(User.id).limit(1000))).scalars().all()
+        client_names = [username(index + 1) for index in range(min(clients, len(user_ids)))]
+        cart_rows = (await conn.execute(
+            select(User.username, Cart.id).join(Cart, Cart.user_id == User.id).filter(User.username.in_(client_names))
+        )).all()
+    if not product_ids or not client_names:
+        raise SystemExit("The database has no benchmark data, run python -m benchmarks.seed first.")
+
+    carts = {}
+    for name, cart_id in cart_rows:
+        carts.setdefault(name, []).append(cart_id)
+    ctx = Context(product_ids=product_ids, category_ids=category_ids, user_ids=user_ids)
+    ctx.clients = [{"username": name, "cart_ids": carts.get(name, [])} for name in client_names]
+    return ctx
+
+
+async def login(client: httpx.AsyncClient, name: str) -> str:
+    response = await client.post("/auth/token", data={"username": name, "password": BENCHMARK_PASSWORD})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def run_endpoint(client: httpx.AsyncClient, ctx: Context, endpoint: Endpoint, args, rng: random.Random) -> dict:
+    latencies = []
+    statuses = Counter()
+    remaining = itertools.count()
+
+    async def call(worker: int, record: bool):
+        client_ctx = ctx.clients[worker % len(ctx.clients)]
+        path, kwargs = endpoint.build(ctx, client_ctx, rng)
+        headers = bearer(ctx.admin_token if endpoint.auth == "admin" else client_ctx["token"]) if endpoint.auth else {}
+        start = time.perf_counter()
+        response = await client.request(endpoint.method, path, headers=headers, **kwargs)
+        await response.aread()
+        if record:
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] += 1
+
+    async def worker(number: int, total: int, record: bool):
+        while next(remaining) < total:
+            await call(number, record)
+
+    # Warm up connections, caches and statement caches before measuring.
+    await asyncio.gather(*(worker(number, args.warmup, False) for number in range(args.concurrency)))
+    remaining = itertools.count()
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(number, args.requests, True) for number in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    errors = sum(count for code, count in statuses.items() if code >= 400)
+    return {
+        "method": endpoint.method,
+        "requests": len(latencies),
+        "errors": errors,
+        "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+        "duration_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p95": round(percentile(latencies, 95) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        },
+    }
+
+
+async def benchmark(args) -> dict:
+    selected = [endpoint for endpoint in ENDPOINTS if not args.endpoints or endpoint.name in args.endpoints]
+    ctx = await load_context(args.concurrency)
+    rng = random.Random(args.seed)
+
+    if not args.rate_limit:
+        # Every client shares one IP in process, measure the endpoints rather than the limiter.
+        settings.rate_limit_enabled = False
+    if args.base_url:
+        transport, base_url, lifespan = None, args.base_url, None
+    else:
+        from main import app
+        transport, base_url, lifespan = httpx.ASGITransport(app=app), "http://benchmark", app.router.lifespan_context(app)
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        if lifespan is not None:
+            await lifespan.__aenter__()
+        try:
+            ctx.admin_token = await login(client, ADMIN_USERNAME)
+            for client_ctx in ctx.clients:
+                client_ctx["token"] = await login(client, client_ctx["username"])
+            for endpoint in selected:
+                results[endpoint.name] = await run_endpoint(client, ctx, endpoint, args, rng)
+                summary = results[endpoint.name]
+                print(f"  {endpoint.name:<20} {summary['throughput_rps']:>9.1f} req/s  "
+                      f"p50 {summary['latency_ms']['p50']:>8.2f} ms  p95 {summary['latency_ms']['p95']:>8.2f} ms  "
+                      f"p99 {summary['latency_ms']['p99']:>8.2f} ms  errors {summary['errors']}")
+        finally:
+            if lifespan is not None:
+                await lifespan.__aexit__(None, None, None)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "database": engine.dialect.name,
+            "target": args.base_url or "in-process",
+            "concurrency": args.concurrency,
+            "requests_per_endpoint": args.requests,
+            "warmup_per_endpoint": args.warmup,
+            "seed": args.seed,
+            "python": platform.python_version(),
+        },
+        "endpoints": results,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every endpoint of the application.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients per endpoint")
+    parser.add_argument("--requests", type=int, default=500, help="Measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=50, help="Unmeasured requests per endpoint")
+    parser.add_argument("--endpoints", nargs="*", choices=[endpoint.name for endpoint in ENDPOINTS],
+                        help="Endpoints to run, all of them by default")
+    parser.add_argument("--base-url", help="Benchmark a running server instead of the app in process")
+    parser.add_argument("--rate-limit", action="store_true", help="Keep rate limiting on for the app in process")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="File the JSON report is written to, printed when omitted")
+    return parser.parse_args(argv)
+
+
+async def main(args):
+    report = await benchmark(args)
+    await engine.dispose()
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+        print(f"Report written to {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
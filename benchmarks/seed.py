@@ -0,0 +1,173 @@
+"""
+Synthetic data generator for the benchmarks, writing users, categories, products and carts
+through batched inserts into the database configured by DATABASE_URL.
+
+    DATABASE_URL=sqlite+aiosqlite:///./bench.db python -m benchmarks.seed --products 1000000 --reset
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, insert, select, text
+
+from app.core.security import hash_password
+from app.db.database import Base, engine, get_sessionmaker
+from app.db.migrations import downgrade_database, upgrade_database
+from app.models.models import Cart, CartItem, Category, Product, User
+from app.services.facets import CategoryFacetService
+
+BENCHMARK_PASSWORD = "benchmark-password"
+ADMIN_USERNAME = "bench_admin"
+
+ADJECTIVES = ["Smart", "Classic", "Ultra", "Compact", "Wireless", "Premium", "Eco", "Portable", "Pro", "Mini",
+              "Vintage", "Rugged", "Silent", "Digital", "Organic", "Foldable", "Heavy", "Light", "Solar", "Modular"]
+NOUNS = ["Phone", "Laptop", "Headphones", "Watch", "Camera", "Speaker", "Keyboard", "Backpack", "Lamp", "Bottle",
+         "Chair", "Desk", "Blender", "Sneakers", "Jacket", "Tablet", "Monitor", "Drone", "Router", "Kettle"]
+WORDS = ["durable", "fast", "battery", "steel", "cotton", "waterproof", "travel", "office", "kitchen", "outdoor",
+         "gaming", "studio", "home", "sport", "bluetooth", "charging", "ergonomic", "quiet", "warm", "bright"]
+
+
+def username(index: int) -> str:
+    return ADMIN_USERNAME if index == 0 else f"bench_user_{index}"
+
+
+def user_rows(count: int, password_hash: str):
+    for index in range(count):
+        name = username(index)
+        yield {
+            "username": name,
+            "email": f"{name}@bench.example.com",
+            "password": password_hash,
+            "full_name": f"Bench User {index}",
+            "role": "admin" if index == 0 else "user",
+        }
+
+
+def category_rows(count: int):
+    for index in range(count):
+        yield {"name": f"Category {index + 1}"}
+
+
+def product_rows(count: int, category_ids: list[int], brands: list[str], rng: random.Random):
+    now = datetime.now(timezone.utc)
+    for index in range(count):
+        title = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {index + 1}"
+        yield {
+            "title": title,
+            "description": " ".join(rng.choices(WORDS, k=12)),
+            "price": rng.randint(1, 2000),
+            "discount_percentage": round(rng.uniform(0, 50), 2),
+            "rating": round(rng.uniform(1, 5), 2),
+            "stock": rng.randint(0, 500),
+            "brand": rng.choice(brands),
+            "thumbnail": f"https://cdn.bench.example.com/products/{index + 1}/thumbnail.jpg",
+            "images": [f"https://cdn.bench.example.com/products/{index + 1}/{image}.jpg" for image in range(3)],
+            "is_published": rng.random() > 0.05,
+            "created_at": now - timedelta(seconds=rng.randint(0, 730 * 24 * 3600)),
+            "category_id": rng.choice(category_ids),
+        }
+
+
+def chunks(rows, size: int):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def insert_rows(model, rows, chunk_size: int, label: str) -> list[int]:
+    """
+    Utility inserting the rows in batches, one transaction per batch, and returning their ids in order.
+    """
+    ids = []
+    start = time.perf_counter()
+    for chunk in chunks(rows, chunk_size):
+        async with engine.begin() as conn:
+            result = await conn.execute(insert(model).returning(model.id, sort_by_parameter_order=True), chunk)
+            ids.extend(result.scalars().all())
+    print(f"  {label}: {len(ids)} rows in {time.perf_counter() - start:.1f}s")
+    return ids
+
+
+async def seed(args):
+    if args.reset:
+        await asyncio.to_thread(downgrade_database)
+        # Tables of a database created before the migrations are not known to alembic.
+        from app.db import search  # noqa: F401
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+    await asyncio.to_thread(upgrade_database)
+
+    async with engine.connect() as conn:
+        if await conn.scalar(select(func.count()).select_from(User)):
+            raise SystemExit("The database already has users, pass --reset to wipe it before seeding.")
+
+    rng = random.Random(args.seed)
+    print(f"Seeding {engine.url.render_as_string(hide_password=True)}")
+
+    # Every user shares one password hash, hashing a million passwords is not what is being measured.
+    await insert_rows(User, user_rows(args.users, hash_password(BENCHMARK_PASSWORD)), args.chunk_size, "users")
+    async with engine.connect() as conn:
+        user_ids = (await conn.execute(select(User.id).order_by(User.id))).scalars().all()
+
+    category_ids = await insert_rows(Category, category_rows(args.categories), args.chunk_size, "categories")
+    brands = [f"Brand {index + 1}" for index in range(args.brands)]
+    product_ids = await insert_rows(
+        Product, product_rows(args.products, category_ids, brands, rng), args.chunk_size, "products")
+
+    # Prices are needed to fill in subtotals, fetched once instead of per cart.
+    async with engine.connect() as conn:
+        prices = {
+            product_id: (price, discount)
+            for product_id, price, discount in await conn.execute(
+                select(Product.id, Product.price, Product.discount_percentage))
+        }
+
+    cart_lines = []
+    cart_rows = []
+    for user_id in user_ids:
+        for _ in range(args.carts_per_user):
+            lines = []
+            for product_id in rng.sample(product_ids, min(args.items_per_cart, len(product_ids))):
+                price, discount = prices[product_id]
+                quantity = rng.randint(1, 5)
+                lines.append({"product_id": product_id, "quantity": quantity,
+                              "subtotal": price * quantity * (1 - discount / 100)})
+            cart_lines.append(lines)
+            cart_rows.append({"user_id": user_id, "total_amount": sum(line["subtotal"] for line in lines)})
+    cart_ids = await insert_rows(Cart, cart_rows, args.chunk_size, "carts")
+
+    item_rows = ({**line, "cart_id": cart_id} for cart_id, lines in zip(cart_ids, cart_lines) for line in lines)
+    await insert_rows(CartItem, item_rows, args.chunk_size, "cart items")
+
+    # The products were inserted directly, their categories are summarized once at the end.
+    start = time.perf_counter()
+    async with get_sessionmaker()() as db:
+        summarized = await CategoryFacetService.rebuild(db)
+    print(f"  category facets: {summarized} rows in {time.perf_counter() - start:.1f}s")
+    await engine.dispose()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Seed the database with synthetic benchmark data.")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--brands", type=int, default=200)
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--carts-per-user", type=int, default=2)
+    parser.add_argument("--items-per-cart", type=int, default=3)
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Rows per insert batch")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed, the same seed produces the same data")
+    parser.add_argument("--reset", action="store_true", help="Drop every table before seeding")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(seed(parse_args()))
@@ -0,0 +1,131 @@
+"""
+Measures the cold start of the application in fresh interpreters: time to import main, to run the
+lifespan startup, and to answer the first request. With --server it instead starts uvicorn and
+measures the time until the first successful response, as a readiness probe would see it.
+
+    DATABASE_URL=sqlite+aiosqlite:///./bench.db python -m benchmarks.startup --runs 10 --output startup.json
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks.run import git_commit
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Runs in the child interpreter, printing its timings as one JSON line.
+CHILD = """
+import asyncio, json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def first_request():
+    import httpx
+    async with main.app.router.lifespan_context(main.app):
+        started = time.perf_counter()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+            response = await client.get(PATH)
+        return started, time.perf_counter(), response.status_code
+
+started, answered, status_code = asyncio.run(first_request())
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "startup_ms": (started - imported) * 1000,
+    "first_request_ms": (answered - started) * 1000,
+    "in_process_total_ms": (answered - start) * 1000,
+    "status_code": status_code,
+}))
+"""
+
+
+def summarize(values: list[float]) -> dict:
+    return {
+        "median": round(statistics.median(values), 3),
+        "min": round(min(values), 3),
+        "max": round(max(values), 3),
+    }
+
+
+def measure_in_process(path: str) -> dict:
+    spawned = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", f"PATH = {path!r}\n{CHILD}"], cwd=ROOT, capture_output=True, text=True, check=True)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    # Includes the interpreter start itself, which the child can not measure.
+    timings["process_total_ms"] = (time.perf_counter() - spawned) * 1000
+    return timings
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_server(path: str, timeout: float) -> dict:
+    port = free_port()
+    spawned = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=os.environ.copy())
+    try:
+        while time.perf_counter() - spawned < timeout:
+            if process.poll() is not None:
+                raise SystemExit(f"The server exited with code {process.returncode} before answering")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=1) as response:
+                    return {"ready_ms": (time.perf_counter() - spawned) * 1000, "status_code": response.status}
+            except OSError:
+                time.sleep(0.01)
+        raise SystemExit(f"The server did not answer within {timeout} seconds")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main(args):
+    runs = []
+    for run in range(args.runs):
+        runs.append(measure_server(args.path, args.timeout) if args.server else measure_in_process(args.path))
+        print(f"  run {run + 1}: " + "  ".join(
+            f"{key} {value:.1f}" for key, value in runs[-1].items() if key.endswith("_ms")))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "mode": "server" if args.server else "in-process",
+            "path": args.path,
+            "runs": args.runs,
+        },
+        "startup": {
+            key: summarize([run[key] for run in runs]) for key in runs[0] if key.endswith("_ms")
+        },
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+        print(f"Report written to {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the cold start of the application.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters started")
+    parser.add_argument("--path", default="/categories/", help="Path of the first request")
+    parser.add_argument("--server", action="store_true", help="Start uvicorn and wait for the first response")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait for the server to answer")
+    parser.add_argument("--output", help="File the JSON report is written to, printed when omitted")
+    main(parser.parse_args())
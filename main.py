@@ -1,8 +1,52 @@
+import asyncio
+import contextlib
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+
+from app.core.hashing import password_hash_pool
+from app.core.idempotency import IdempotencyMiddleware
+from app.core.invalidation import invalidation_bus
+from app.core.metrics import MetricsMiddleware
+from app.core.rate_limit import RateLimitMiddleware
+from app.db.database import check_database, dispose_engines
+from app.db.replicas import check_replicas, get_replicas, monitor_replicas
+from app.core.config import settings
+from app.routers import auth, account, users, categories, products, cart, internal, metrics
+from app.services.stock import sweep_expired_reservations
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The engine is created and connected here rather than at import. The schema is managed
+    # by the migrations, run `alembic upgrade head` before starting the app.
+    await check_database()
+    tasks = []
+    # Gives the stock of expired cart reservations back in the background.
+    if settings.stock_reservation_sweep_interval_seconds > 0:
+        tasks.append(asyncio.create_task(sweep_expired_reservations()))
+    # Applies the cache invalidations published by the other workers.
+    if invalidation_bus.enabled:
+        tasks.append(asyncio.create_task(invalidation_bus.listen()))
+    # Read replicas are checked before serving, then kept out of rotation while unhealthy or behind.
+    if get_replicas():
+        await check_replicas()
+        tasks.append(asyncio.create_task(monitor_replicas()))
+    yield
+    for task in tasks:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    await dispose_engines()
+    password_hash_pool.shutdown()
 
-from app.routers import auth, account, users, categories, products, cart
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+# Retried creations replay their first response instead of running again.
+app.add_middleware(IdempotencyMiddleware, routes={("POST", "/cart/"), ("POST", "/auth/signup")})
+app.add_middleware(RateLimitMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(auth.router)
 app.include_router(account.router)
@@ -11,3 +55,5 @@ app.include_router(categories.router)
 app.include_router(cart.router)
 
 app.include_router(products.router)
+app.include_router(internal.router)
+app.include_router(metrics.router)
@@ -0,0 +1,66 @@
+import os
+import tempfile
+
+# The settings are read on first use: the app is pointed at a throwaway SQLite database before anything opens it.
+os.environ.update({
+    "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}",
+    "DATABASE_REPLICA_URLS": "",
+    "RATE_LIMIT_ENABLED": "false",
+    "STOCK_RESERVATION_SWEEP_INTERVAL_SECONDS": "0",
+    "BCRYPT_ROUNDS": "4",
+})
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.cache import caches
+from app.db.migrations import upgrade_database
+from main import app
+
+
+@pytest.fixture(scope="session")
+def client():
+    upgrade_database()
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    # Every test measures the uncached path unless it warms the caches itself.
+    for cache in caches.values():
+        cache.clear()
+
+
+@pytest.fixture(scope="session")
+def auth_headers(client):
+    user = {"full_name": "Test User", "username": "tester", "email": "tester@example.com", "password": "secret"}
+    assert client.post("/auth/signup", json=user).status_code == 201
+    response = client.post("/auth/token", data={"username": user["username"], "password": user["password"]})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture(scope="session")
+def product_ids(client):
+    category_id = client.post("/categories/", json={"name": "Phones"}).json()["data"]["id"]
+    product = {
+        "description": "A phone", "price": 100, "discount_percentage": 10, "rating": 4.5, "stock": 1000,
+        "thumbnail": "thumbnail.png", "images": ["image.png"], "is_published": True,
+        "created_at": "2024-01-01T00:00:00", "category_id": category_id,
+    }
+    return [
+        client.post("/products/", json={**product, "title": f"Phone {index}", "brand": f"Brand {index % 2}"})
+        .json()["data"]["id"]
+        for index in range(5)
+    ]
+
+
+@pytest.fixture
+def cart_id(client, auth_headers, product_ids):
+    cart = {"cart_items": [{"product_id": product_id, "quantity": 1} for product_id in product_ids]}
+    response = client.post("/cart/", json=cart, headers=auth_headers)
+    assert response.status_code == 201, response.text
+    return response.json()["data"]["id"]
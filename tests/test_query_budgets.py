@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db.query_counter import QueryBudget, QueryCounter, assert_max_queries
+
+
+def test_list_products_runs_one_query(client, product_ids):
+    with assert_max_queries(1):
+        response = client.get("/products/")
+    assert response.status_code == 200
+    assert {product["id"] for product in response.json()["data"]} >= set(product_ids)
+
+
+def test_cached_product_list_runs_no_query(client, product_ids):
+    client.get("/products/")
+    with assert_max_queries(0):
+        assert client.get("/products/").status_code == 200
+
+
+def test_get_cart_does_not_query_per_line(client, auth_headers, cart_id, product_ids):
+    # Principal, cart, then every line with its product.
+    with assert_max_queries(3, max_repeats=1):
+        response = client.get(f"/cart/{cart_id}", headers=auth_headers)
+    assert response.status_code == 200
+    assert len(response.json()["data"]["cart_items"]) == len(product_ids)
+
+
+def test_account_does_not_query_per_cart(client, auth_headers, product_ids):
+    for product_id in product_ids[:2]:
+        cart = {"cart_items": [{"product_id": product_id, "quantity": 1}]}
+        assert client.post("/cart/", json=cart, headers=auth_headers).status_code == 201
+
+    # Principal, user, then the carts and their lines with one query each.
+    with assert_max_queries(4, max_repeats=1):
+        response = client.get("/account/me", headers=auth_headers)
+    assert response.status_code == 200
+    assert len(response.json()["data"]["carts"]) >= 2
+
+
+def test_budget_reports_the_statements_over_the_limit(client, product_ids):
+    with pytest.raises(AssertionError, match="Expected at most 0 queries, 1 were executed"):
+        with QueryBudget(0):
+            client.get("/products/")
+
+
+def test_budget_reports_repeated_statements():
+    engine = create_async_engine("sqlite+aiosqlite://")
+
+    @QueryBudget(10, max_repeats=1, engine=engine)
+    async def select_one_by_one():
+        async with engine.connect() as conn:
+            for value in range(3):
+                await conn.execute(text(f"SELECT {value}"))
+
+    try:
+        with pytest.raises(AssertionError, match=r"3x SELECT \?"):
+            asyncio.run(select_one_by_one())
+    finally:
+        asyncio.run(engine.dispose())
+
+
+def test_counter_groups_statements_by_shape():
+    engine = create_async_engine("sqlite+aiosqlite://")
+
+    async def run():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1 WHERE 1 IN (1, 2)"))
+            await conn.execute(text("SELECT 2 WHERE 2 IN (3)"))
+            await conn.execute(text("SELECT 'other'"))
+
+    try:
+        with QueryCounter(engine) as counter:
+            asyncio.run(run())
+    finally:
+        asyncio.run(engine.dispose())
+    assert counter.count == 3
+    assert sorted(counter.fingerprints.values()) == [1, 2]
+    assert counter.repeated(1) == [("SELECT ? WHERE ? IN (...)", 2)]
@@ -0,0 +1,120 @@
+import logging
+
+import pytest
+
+from app.core.config import get_settings
+from app.core.metrics import RequestStats, current_request_stats
+from app.db.diagnostics import check_n_plus_one, explain, fingerprint, normalize_statement
+
+
+def test_normalize_statement_keeps_only_the_shape():
+    statement = "SELECT *\n  FROM products WHERE id IN (?, ?, ?) AND title = 'it''s' AND price > 10.5"
+    assert normalize_statement(statement) == "SELECT * FROM products WHERE id IN (...) AND title = ? AND price > ?"
+
+
+def test_fingerprint_ignores_values_and_placeholder_style():
+    assert fingerprint("SELECT * FROM carts WHERE id = $1") == fingerprint("SELECT * FROM carts WHERE id = 42")
+    assert fingerprint("SELECT * FROM carts WHERE id = :id") == fingerprint("SELECT * FROM carts WHERE id = ?")
+    assert fingerprint("SELECT * FROM carts") != fingerprint("SELECT * FROM products")
+
+
+@pytest.fixture
+def diagnostics_settings(monkeypatch):
+    def configure(**values):
+        for name, value in values.items():
+            monkeypatch.setattr(get_settings(), name, value)
+    return configure
+
+
+def test_slow_query_is_logged_with_its_plan(client, product_ids, caplog, diagnostics_settings):
+    diagnostics_settings(slow_query_threshold_ms=1e-6, slow_query_explain=True)
+    with caplog.at_level(logging.WARNING, logger="app.db.diagnostics"):
+        assert client.get("/products/").status_code == 200
+
+    messages = [record.getMessage() for record in caplog.records if record.getMessage().startswith("Slow query")]
+    assert messages
+    assert "FROM products" in messages[0]
+    assert "plan:" in messages[0] and "unavailable" not in messages[0]
+
+
+def test_fast_query_is_not_logged(client, product_ids, caplog, diagnostics_settings):
+    diagnostics_settings(slow_query_threshold_ms=60_000)
+    with caplog.at_level(logging.WARNING, logger="app.db.diagnostics"):
+        assert client.get("/products/").status_code == 200
+    assert not [record for record in caplog.records if record.getMessage().startswith("Slow query")]
+
+
+def test_repeated_statement_is_reported_once_per_request(caplog, diagnostics_settings):
+    diagnostics_settings(n_plus_one_threshold=2)
+    token = current_request_stats.set(RequestStats(method="GET", path="/cart/1"))
+    try:
+        with caplog.at_level(logging.WARNING, logger="app.db.diagnostics"):
+            for product_id in range(5):
+                check_n_plus_one(f"SELECT * FROM products WHERE id = {product_id}")
+            check_n_plus_one("SELECT * FROM carts WHERE id = 1")
+    finally:
+        current_request_stats.reset(token)
+
+    messages = [record.getMessage() for record in caplog.records]
+    assert len(messages) == 1
+    assert messages[0].startswith("Possible N+1 query: GET /cart/1 ran the same statement more than 2 times")
+    assert "SELECT * FROM products WHERE id = ?" in messages[0]
+
+
+def test_statements_outside_a_request_are_not_tracked(caplog, diagnostics_settings):
+    diagnostics_settings(n_plus_one_threshold=1)
+    with caplog.at_level(logging.WARNING, logger="app.db.diagnostics"):
+        for _ in range(3):
+            check_n_plus_one("SELECT 1")
+    assert not caplog.records
+
+
+class RecordingCursor:
+    def __init__(self, statements, fail_on):
+        self.statements = statements
+        self.fail_on = fail_on
+
+    def execute(self, statement, parameters=None):
+        self.statements.append(statement)
+        if statement.startswith(self.fail_on):
+            raise RuntimeError("explain failed")
+
+    def fetchall(self):
+        return [("Seq Scan on products",)]
+
+    def close(self):
+        pass
+
+
+class PostgresConnection:
+    """The parts of a Postgres connection inside a transaction that explain() uses."""
+
+    class dialect:
+        name = "postgresql"
+
+    def __init__(self, fail_on="never"):
+        self.statements = []
+        self.connection = self
+        self.fail_on = fail_on
+
+    def in_transaction(self):
+        return True
+
+    def cursor(self):
+        return RecordingCursor(self.statements, self.fail_on)
+
+
+def test_explain_runs_inside_a_savepoint_on_postgres():
+    conn = PostgresConnection()
+    assert explain(conn, "SELECT * FROM products", ()) == "  Seq Scan on products"
+    assert conn.statements == [
+        "SAVEPOINT slow_query_explain", "EXPLAIN SELECT * FROM products", "RELEASE SAVEPOINT slow_query_explain"]
+
+
+def test_failed_explain_rolls_back_to_its_savepoint():
+    conn = PostgresConnection(fail_on="EXPLAIN")
+    with pytest.raises(RuntimeError):
+        explain(conn, "SELECT * FROM products", ())
+    # The request's transaction stays usable: only the savepoint is rolled back.
+    assert conn.statements == [
+        "SAVEPOINT slow_query_explain", "EXPLAIN SELECT * FROM products", "ROLLBACK TO SAVEPOINT slow_query_explain"]